@@ -0,0 +1,200 @@
+#!/usr/bin/python3
+# Offline benchmarks for cal.py, no bot token needed.
+# The first part times the task functions on lists of different sizes.
+# The second part starts the bot with a fake Discord client (FakeClient below),
+# sends it commands from many fake users through on_message, then lets every
+# user's reminder come due at once and times how long they take to go out.
+# Everything is written to a temporary folder that is deleted afterwards.
+#
+# python3 bench.py
+# python3 bench.py --sizes 10,1000 --users 50 --storage journal
+
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+import cal
+
+def percentile(samples, percent):
+  """Function to return the PERCENT percentile of SAMPLES (a sorted list)"""
+  return samples[min(len(samples) - 1, int(len(samples) * percent / 100))]
+
+def report(name, size, samples):
+  """Function to print one line of results for the timings in SAMPLES (in seconds)"""
+  samples = sorted(samples)
+  total = sum(samples)
+  rate = len(samples) / total if total else float('inf')
+  print(f"{name:<22}{size:>8}{len(samples):>8}{rate:>14,.0f}/s"
+        f"{percentile(samples, 50) * 1000:>11.3f}{percentile(samples, 95) * 1000:>11.3f}{percentile(samples, 99) * 1000:>11.3f}")
+
+def header(title):
+  """Function to print the column names for a table called TITLE"""
+  print(f"\n{title}\n{'name':<22}{'size':>8}{'runs':>8}{'throughput':>16}{'p50 ms':>11}{'p95 ms':>11}{'p99 ms':>11}")
+
+def make_list(size):
+  """Function to return a TaskList with SIZE tasks, every other one done"""
+  tasks = cal.TaskList()
+  for number in range(size):
+    tasks.add(f"Task number {number}", number % 2)
+  return tasks
+
+def measure(setup, run, budget, most=10000, undo=None):
+  """Function to time RUN(SETUP()) over and over, until BUDGET seconds were spent in it
+  or it ran MOST times. Only RUN is timed. UNDO(SETUP()'s value) is called after each run, if given,
+  to put things back the way they were. Returns the list of timings"""
+  samples = []
+  while sum(samples) < budget and len(samples) < most:
+    value = setup()
+    before = time.perf_counter()
+    run(value)
+    samples.append(time.perf_counter() - before)
+    if undo is not None:
+      undo(value)
+  return samples
+
+def bench_functions(sizes, budget, folder):
+  """Function to time each task function on lists of every size in SIZES"""
+  header("Task functions")
+  cal.data_dir = folder
+  owner = cal.owner_dir(1, 1)
+  for size in sizes:
+    tasks = make_list(size)
+    middle = size // 2 #an id in the middle of the list
+    def unadd(tasks):
+      tasks.remove(tasks.next_id - 1) #the task the last run added, so the list stays at SIZE
+      tasks.next_id -= 1
+      return tasks
+    report('create_task', size, measure(lambda: tasks, lambda tasks: cal.create_task(tasks, 'New task'), budget, undo=unadd))
+    def readd(tasks):
+      tasks.add('Task', 0, -1) #an id of its own, so there is always something to delete
+      return tasks
+    report('delete_task', size, measure(lambda: readd(tasks), lambda tasks: cal.delete_task(tasks, -1), budget))
+    report('edit_attr', size, measure(lambda: tasks, lambda tasks: cal.edit_attr(tasks, middle, 'content', str.upper), budget))
+    report('toggle_status', size, measure(lambda: tasks, lambda tasks: cal.toggle_status(tasks, middle), budget))
+    def changed(tasks):
+      cal.toggle_status(tasks, middle) #so the cached text is out of date
+      return tasks
+    report('make_text', size, measure(lambda: changed(tasks), cal.make_text, budget))
+    report('make_text (cached)', size, measure(lambda: tasks, cal.make_text, budget))
+    cal.store.write(os.path.join(owner, cal.get_time("%A")), make_list(size))
+    def fresh_day(_):
+      cal.store.write(cal.today(owner), make_list(10)) #load_template adds to it, so start over each time
+    report('load_template', size, measure(lambda: fresh_day(None), lambda _: cal.load_template(owner), budget))
+    filename = os.path.join(folder, f"list-{size}")
+    saved = tasks.to_json()
+    report('list_write', size, measure(lambda: saved, lambda saved: cal.list_write(filename, saved), budget))
+    report('list_read', size, measure(lambda: filename, cal.list_read, budget))
+  cal.store.lists.clear()
+  cal.store.dirty.clear()
+
+class FakeUser:
+  """Stand-in for a discord.py user or member"""
+  def __init__(self, id, bot=False):
+    self.id = id
+    self.bot = bot
+
+class FakeMessage:
+  """Stand-in for a discord.py message"""
+  def __init__(self, content, author=None, channel=None, guild=None):
+    self.content = content
+    self.author = author
+    self.channel = channel
+    self.guild = guild
+    self.attachments = []
+
+  async def edit(self, content=None):
+    self.content = content
+
+class FakeGuild:
+  """Stand-in for a discord.py server"""
+  def __init__(self, id):
+    self.id = id
+
+class FakeChannel:
+  """Stand-in for a discord.py text channel that counts what is sent to it"""
+  def __init__(self, id):
+    self.id = id
+    self.sent = 0
+
+  async def send(self, content=None, **kwargs):
+    self.sent += 1
+    return FakeMessage(content, channel=self)
+
+class FakeClient:
+  """Stand-in for the commands.Bot in cal.py. It collects the event handlers start()
+  registers, and when start() calls run() it runs SCENARIO(self) instead of connecting to Discord."""
+  def __init__(self, scenario):
+    self.user = FakeUser(0, bot=True)
+    self.events = {}
+    self.channels = {}
+    self.scenario = scenario
+
+  def event(self, function):
+    self.events[function.__name__] = function
+    return function
+
+  def get_channel(self, id):
+    return self.channels.get(id)
+
+  def run(self, token):
+    asyncio.run(self.scenario(self))
+
+COMMANDS = [ #what every fake user sends, in this order
+  ',cta Wake up; Eat breakfast; Go to work',
+  ',sta',
+  ',ts 1',
+  ',eta 2 Go to school',
+  ',dta 0',
+  ',cte Monday Stretch; Read',
+  ',ste',
+  ',lte',
+]
+
+def bench_bot(users, rounds, storage, folder):
+  """Function to run the bot on a FakeClient. USERS fake users, each in their own channel,
+  send every command in COMMANDS ROUNDS times. Then everyone's reminder is made due at once."""
+  timings = {text.split(' ')[0]: [] for text in COMMANDS}
+  reminders = []
+
+  async def scenario(client):
+    await client.events['on_ready']()
+    cal.outbox.rate = 10 ** 9 #time our code, not Discord's rate limit
+    people = [(FakeUser(number + 1), FakeChannel(number + 1)) for number in range(users)]
+    for user, channel in people:
+      client.channels[channel.id] = channel
+    for _ in range(rounds):
+      for text in COMMANDS:
+        for user, channel in people:
+          before = time.perf_counter()
+          await client.events['on_message'](FakeMessage(text, user, channel, FakeGuild(1)))
+          timings[text.split(' ')[0]].append(time.perf_counter() - before)
+    while cal.outbox.queues: #let the replies go out first
+      await asyncio.sleep(0)
+    sent = sum(channel.sent for user, channel in people)
+    before = time.perf_counter()
+    for owner in cal.subscribers:
+      cal.scheduler.schedule(time.time(), 'digest', owner)
+    while sum(channel.sent for user, channel in people) < sent + users:
+      await asyncio.sleep(0.001)
+    reminders.append(time.perf_counter() - before)
+
+  cal.client = FakeClient(scenario)
+  cal.start('token', '0', 3600, -1, -1, [], storage=storage, data=folder) #quiet hours -1 to -1 never happen
+  header(f"Bot commands ({users} users, {rounds} rounds, {storage} storage)")
+  for name, samples in timings.items():
+    report(name, users, samples)
+  print(f"\nReminders: {users} sent in {reminders[0] * 1000:.1f} ms ({users / reminders[0]:,.0f}/s)")
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description="Offline benchmarks for cal.py")
+  parser.add_argument('--sizes', default='10,1000,100000', help="list sizes for the task functions, separated by commas")
+  parser.add_argument('--budget', type=float, default=0.5, help="seconds to spend timing each function at each size")
+  parser.add_argument('--users', type=int, default=200, help="fake users sending commands to the bot")
+  parser.add_argument('--rounds', type=int, default=3, help="times every user sends every command")
+  parser.add_argument('--storage', default='json', choices=sorted(cal.BACKENDS), help="storage backend for the bot")
+  args = parser.parse_args()
+  with tempfile.TemporaryDirectory() as folder:
+    bench_functions([int(size) for size in args.sizes.split(',')], args.budget, folder)
+    bench_bot(args.users, args.rounds, args.storage, os.path.join(folder, 'bot'))
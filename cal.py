@@ -5,6 +5,8 @@
 # varying categories, and be marked done/not done through chat.
 # Tasks are saved as a list of dicts to a file, named by MM-DD-YYYY
 # Each new day, a new task list is created and saved.
+# Every user gets their own set of files, kept in a folder for their
+# server and user id (see owner_dir), so many people can share one bot.
 #
 # Also, a template file can be made. It takes in a list of
 # day, content. When creating a new daily list, we look through the template
@@ -13,27 +15,748 @@
 # A task should look like this:
 # [ [id, [{"content": content}, {"status": status}]] ]
 # Basically, a list whose index 0 is an ID, and 1 is a list of dicts
+# A task with a due time also has a {"due": "HH:MM"} dict.
+# In memory, the same list is held as a TaskList of Task objects (see below),
+# which is converted back to this shape whenever it is saved.
 
 
-from datetime import datetime as dt
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+from datetime import datetime as dt, timedelta
+import asyncio
+import bisect
+import contextvars
+import cProfile
+import csv
+import hashlib
+import heapq
+import io
+import itertools
 import json
+import logging
 import os
-import copy
+import pstats
+import random
+import re
+import sqlite3
+import threading
+import time
 import discord
 from discord.ext import commands, tasks
 from dotenv import load_dotenv
 
+log = logging.getLogger('cal')
+
+class Metrics:
+  """Class that collects counters, latency histograms and gauges about the bot, keyed by
+  name and labels the way Prometheus does it. Counters and histograms can be updated from
+  the storage threads too. Gauges are functions that are only called when exporting.
+  If PROFILE_RATE is above 0, that fraction of commands is also run under cProfile (see sample_profile)."""
+
+  BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10) #in seconds
+
+  def __init__(self):
+    self.counters = {} #(name, labels) -> number
+    self.histograms = {} #(name, labels) -> {"buckets": count per bucket, the last one unbounded, "count", "sum"}
+    self.gauges = {} #name -> function returning the current value
+    self.lock = threading.Lock()
+    self.profile_rate = 0
+    self.profile = None #pstats.Stats of every sampled command so far
+    self.profiler = None #the one running, only one can run at a time
+    self.profile_changed = False
+
+  def count(self, name, amount=1, **labels):
+    """Function to add AMOUNT to counter NAME with LABELS"""
+    key = (name, tuple(sorted(labels.items())))
+    with self.lock:
+      self.counters[key] = self.counters.get(key, 0) + amount
+
+  def observe(self, name, seconds, **labels):
+    """Function to record a duration of SECONDS in histogram NAME with LABELS"""
+    key = (name, tuple(sorted(labels.items())))
+    with self.lock:
+      histogram = self.histograms.get(key)
+      if histogram is None:
+        histogram = self.histograms[key] = {"buckets": [0] * (len(self.BUCKETS) + 1), "count": 0, "sum": 0}
+      histogram["buckets"][bisect.bisect_left(self.BUCKETS, seconds)] += 1
+      histogram["count"] += 1
+      histogram["sum"] += seconds
+
+  def gauge(self, name, function):
+    """Function to export the result of FUNCTION() as gauge NAME"""
+    self.gauges[name] = function
+
+  def total(self, name, **labels):
+    """Function to add up counter NAME over every label set containing LABELS"""
+    wanted = set(labels.items())
+    with self.lock: #the storage threads may be adding counters
+      counters = list(self.counters.items())
+    return sum(value for (each, labels), value in counters if each == name and wanted <= set(labels))
+
+  def quantile(self, histogram, fraction):
+    """Function to estimate the FRACTION quantile of HISTOGRAM, as the upper edge of the bucket it falls in"""
+    seen = 0
+    for bound, number in zip(self.BUCKETS + (float('inf'),), histogram["buckets"]):
+      seen += number
+      if seen >= fraction * histogram["count"]:
+        return bound
+    return float('inf')
+
+  def sample_profile(self):
+    """Function that returns an enabled cProfile.Profile for PROFILE_RATE of the calls, and None otherwise.
+    Hand it back to add_profile() when done. It sees everything the event loop runs meanwhile, not just one command."""
+    if self.profiler is not None or self.profile_rate <= 0 or random.random() >= self.profile_rate:
+      return None
+    profiler = cProfile.Profile()
+    profiler.enable()
+    self.profiler = profiler
+    return profiler
+
+  def pause_profile(self, profiler):
+    """Function to stop PROFILER for a while, so another command can be sampled meanwhile"""
+    if self.profiler is profiler:
+      profiler.disable()
+      self.profiler = None
+
+  def resume_profile(self, profiler):
+    """Function to start PROFILER again after pause_profile(), unless another one took over meanwhile"""
+    if self.profiler is None:
+      profiler.enable()
+      self.profiler = profiler
+
+  def add_profile(self, profiler):
+    """Function to stop PROFILER and add what it saw to the collected profile"""
+    profiler.disable()
+    if self.profiler is profiler:
+      self.profiler = None
+    if self.profile is None:
+      self.profile = pstats.Stats(profiler)
+    else:
+      self.profile.add(profiler)
+    self.profile_changed = True
+
+  def prometheus(self):
+    """Function to return every metric in the Prometheus text format"""
+    def labels_text(labels):
+      return '{' + ','.join(f'{name}="{value}"' for name, value in labels) + '}' if labels else ''
+    lines = []
+    with self.lock:
+      counters = sorted(self.counters.items())
+      histograms = sorted((key, dict(value, buckets=list(value["buckets"]))) for key, value in self.histograms.items())
+    typed = set()
+    for (name, labels), value in counters:
+      if name not in typed:
+        lines.append(f"# TYPE {name} counter")
+        typed.add(name)
+      lines.append(f"{name}{labels_text(labels)} {value}")
+    for (name, labels), histogram in histograms:
+      if name not in typed:
+        lines.append(f"# TYPE {name} histogram")
+        typed.add(name)
+      seen = 0
+      for bound, number in zip(self.BUCKETS + ('+Inf',), histogram["buckets"]):
+        seen += number
+        lines.append(f"{name}_bucket{labels_text(labels + (('le', bound),))} {seen}")
+      lines.append(f"{name}_sum{labels_text(labels)} {histogram['sum']}")
+      lines.append(f"{name}_count{labels_text(labels)} {histogram['count']}")
+    for name, function in sorted(self.gauges.items()):
+      lines.append(f"# TYPE {name} gauge")
+      lines.append(f"{name} {function()}")
+    return '\n'.join(lines) + '\n'
+
+  def summary(self):
+    """Function to return the most useful metrics as a short human-readable text"""
+    def rate(hits, misses):
+      return f"{hits / (hits + misses) * 100:.1f}%" if hits + misses else "n/a"
+    text = "Commands (count, average, ~95th percentile):\n"
+    with self.lock:
+      commands = sorted((dict(labels)["command"], dict(histogram)) for (name, labels), histogram in self.histograms.items() if name == 'command_seconds')
+      lag = dict(self.histograms.get(('event_loop_lag_seconds', ()), {}))
+    for name, histogram in commands:
+      text += f"- {name}: {histogram['count']}, {histogram['sum'] / histogram['count'] * 1000:.1f} ms, under {self.quantile(histogram, 0.95) * 1000:g} ms\n"
+    if not commands:
+      text += "- none yet\n"
+    text += f"\nStorage: {self.total('storage_reads_total')} reads ({self.total('storage_read_bytes_total')} bytes), "
+    text += f"{self.total('storage_writes_total')} writes ({self.total('storage_write_bytes_total')} bytes)\n"
+    text += f"List cache hit rate: {rate(self.total('store_cache_total', result='hit'), self.total('store_cache_total', result='miss'))}\n"
+    text += f"Render cache hit rate: {rate(self.total('render_cache_total', result='hit'), self.total('render_cache_total', result='miss'))}\n"
+    if lag:
+      text += f"Event loop lag: {lag['sum'] / lag['count'] * 1000:.1f} ms on average, ~95th percentile under {self.quantile(lag, 0.95) * 1000:g} ms\n"
+    text += f"Reminders: {self.total('reminders_total', result='sent')} sent, {self.total('reminders_total', result='unchanged')} skipped as unchanged\n"
+    for name, function in sorted(self.gauges.items()):
+      text += f"{name.replace('_', ' ').capitalize()}: {function()}\n"
+    return text
+
+metrics = Metrics()
+
+def write_metrics(filename, text):
+  """Function to replace FILENAME with the metrics TEXT, so whoever reads it never sees half of it"""
+  with open(filename + '.tmp', 'w') as save:
+    save.write(text)
+  os.replace(filename + '.tmp', filename)
+
 def list_write(filename, list):
   """Function to save LIST (list) that is passed in to a FILENAME (string).
   If the file already exists, its content is overwritten. Returns LIST"""
+  os.makedirs(os.path.dirname(filename) or '.', exist_ok=True) #the owner's folder may be new
+  text = json.dumps(list)
   with open(filename, 'w') as save: #w is overwrite
-     save.write(json.dumps(list))
+     save.write(text)
+  metrics.count('storage_writes_total', kind='json')
+  metrics.count('storage_write_bytes_total', len(text), kind='json')
   return list #returns in case we want to reuse this somewhere
 
 def list_read(filename):
   """Function to read FILENAME and return the list inside"""
   with open(filename) as read:
-    return json.load(read) #return contents with their correct type
+    text = read.read()
+  metrics.count('storage_reads_total', kind='json')
+  metrics.count('storage_read_bytes_total', len(text), kind='json')
+  return json.loads(text) #return contents with their correct type
+
+class Task:
+  """Class for a single task. Uses __slots__ so thousands of them stay small."""
+  __slots__ = ('id', 'content', 'status', 'due')
+
+  def __init__(self, id, content, status=0, due=None):
+    self.id = id
+    self.content = content
+    self.status = status
+    self.due = due #"HH:MM", or None if the task has no due time
+
+  def to_json(self):
+    """Function to turn the task back into [id, [{"content": content}, {"status": status}]]"""
+    dicts = [{"content": self.content}, {"status": self.status}]
+    if self.due is not None:
+      dicts.append({"due": self.due})
+    return [self.id, dicts]
+
+class TaskList:
+  """Class holding the tasks of one list, indexed by their id.
+  Dicts keep insertion order, so tasks still come out in the order they were made.
+  Ids come from a counter that only goes up, so making a task never has to look at the others.
+  VERSION goes up on every change, which lets make_text reuse what it rendered last time."""
+
+  def __init__(self):
+    self.tasks = {} #id -> Task
+    self.next_id = 0
+    self.version = 0
+    self.rendered = None #(version, text) from the last make_text
+
+  def __len__(self):
+    return len(self.tasks)
+
+  def __iter__(self):
+    return iter(self.tasks.values())
+
+  def __contains__(self, id):
+    return id in self.tasks
+
+  def __eq__(self, other):
+    return isinstance(other, TaskList) and self.to_json() == other.to_json()
+
+  def get(self, id):
+    """Function to return task ID, or None if there is none"""
+    return self.tasks.get(id)
+
+  def add(self, content, status=0, id=None, due=None):
+    """Function to add a task with CONTENT, STATUS and DUE time. ID is only passed in when loading
+    saved tasks; if a task with that ID exists it is overwritten in place. Returns the Task"""
+    if id is None:
+      id = self.next_id
+    if id in self.tasks:
+      task = self.tasks[id]
+      task.content, task.status, task.due = content, status, due
+    else:
+      task = self.tasks[id] = Task(id, content, status, due)
+    self.next_id = max(self.next_id, id + 1)
+    self.version += 1
+    return task
+
+  def remove(self, id):
+    """Function to remove task ID. Returns False if there was no such task"""
+    if self.tasks.pop(id, None) is None:
+      return False
+    self.version += 1
+    return True
+
+  def copy(self):
+    """Function to return a separate TaskList with the same tasks"""
+    new_list = TaskList()
+    for task in self:
+      new_list.add(task.content, task.status, task.id, task.due)
+    new_list.next_id = self.next_id
+    return new_list
+
+  @classmethod
+  def from_json(cls, list):
+    """Function to build a TaskList out of the on-disk LIST of [id, [dicts]], which may end in {"next_id": n}"""
+    new_list = cls()
+    for each in list:
+      if isinstance(each, dict): #the saved counter (see to_json), or something a backend keeps there
+        new_list.next_id = max(new_list.next_id, each.get("next_id", 0))
+        continue
+      content, status, due = None, 0, None
+      for part in each[1]: #content, status and due live in separate dicts
+        if 'content' in part:
+          content = part['content']
+        elif 'status' in part:
+          status = part['status']
+        elif 'due' in part:
+          due = part['due']
+      new_list.add(content, status, each[0], due)
+    return new_list
+
+  def to_json(self):
+    """Function to turn the TaskList back into the on-disk list of [id, [dicts]]. If the newest tasks were
+    deleted, the id counter is saved at the end as {"next_id": n}, so their ids are not handed out again after a reload"""
+    saved = [task.to_json() for task in self]
+    if self.next_id > max(self.tasks, default=-1) + 1:
+      saved.append({"next_id": self.next_id})
+    return saved
+
+def list_write_atomic(filename, list):
+  """Function to save LIST to FILENAME like list_write, but through a temporary
+  file that is renamed over FILENAME. A crash leaves either the old or the new
+  file behind, never a truncated one. Returns LIST"""
+  temp = filename + '.tmp'
+  os.makedirs(os.path.dirname(filename) or '.', exist_ok=True) #the owner's folder may be new
+  text = json.dumps(list)
+  with open(temp, 'w') as save:
+    save.write(text)
+    save.flush()
+    os.fsync(save.fileno()) #make sure the data is on disk before the rename
+  os.replace(temp, filename) #atomic on both POSIX and Windows
+  metrics.count('storage_writes_total', kind='json')
+  metrics.count('storage_write_bytes_total', len(text), kind='json')
+  return list
+
+def apply_op(list, op):
+  """Function to apply one journal record OP to the TaskList LIST, in place.
+  Records look like this:
+  ["create", id, content, status], ["delete", id], ["edit", id, key, value]
+  Every record sets a value instead of changing it (a toggle is saved as an edit
+  of the status), so replaying a record twice gives the same list as replaying it once."""
+  if op[0] == 'create':
+    list.add(op[2], op[3], op[1]) #overwrites the task if it was already applied
+  elif op[0] == 'delete':
+    list.remove(op[1])
+  elif op[0] == 'edit':
+    edit_task(list, op[1], op[2], op[3])
+  else:
+    raise ValueError(f"Unknown journal record {op}")
+  return list
+
+class JsonBackend:
+  """Storage backend that keeps every list as one JSON file named after it.
+  Each save rewrites the whole file."""
+
+  def exists(self, filename):
+    """Function to check if FILENAME is on disk"""
+    return os.path.isfile(filename)
+
+  def load(self, filename):
+    """Function to read the TaskList saved as FILENAME"""
+    return TaskList.from_json(list_read(filename))
+
+  def save(self, filename, list, ops):
+    """Function to save the TaskList LIST as FILENAME. OPS is ignored here."""
+    list_write(filename, list.to_json())
+
+  def mtime(self, filename):
+    """Function to return when FILENAME last changed on disk, or None if it does not exist"""
+    return os.path.getmtime(filename) if os.path.isfile(filename) else None
+
+  def remove(self, filename):
+    """Function to delete FILENAME from disk"""
+    if os.path.isfile(filename):
+      os.remove(filename)
+
+class JournalBackend:
+  """Storage backend that appends small records (see apply_op) to FILENAME.journal
+  instead of rewriting the list, so a save costs as much as the change itself.
+  FILENAME holds a snapshot in the same format JsonBackend uses, which means
+  existing files are picked up as they are. Once the journal is longer than
+  COMPACT_EVERY records, it is folded into a new snapshot (written with
+  list_write_atomic) and emptied.
+  Every snapshot ends in a {"journal": generation} record, and every journal starts with a
+  {"generation": generation} line, so a journal left over from before the snapshot is never replayed onto it.
+  Files without them count as generation 0."""
+
+  def __init__(self, compact_every=100):
+    self.compact_every = compact_every
+    self.lengths = {} #filename -> number of records in its journal
+    self.generations = {} #filename -> generation of its snapshot
+
+  def exists(self, filename):
+    """Function to check if FILENAME has a snapshot or a journal on disk"""
+    return os.path.isfile(filename) or os.path.isfile(filename + '.journal')
+
+  def load(self, filename):
+    """Function to read the snapshot for FILENAME and replay its journal on top"""
+    saved = list_read(filename) if os.path.isfile(filename) else []
+    generation = max((each.get("journal", 0) for each in saved if isinstance(each, dict)), default=0)
+    list = TaskList.from_json(saved)
+    count = 0
+    stale = False
+    if os.path.isfile(filename + '.journal'):
+      with open(filename + '.journal', 'rb+') as journal:
+        while True:
+          start = journal.tell()
+          line = journal.readline()
+          if not line:
+            break
+          try:
+            op = json.loads(line)
+          except ValueError: #the last record was cut off by a crash, everything before it is fine
+            journal.truncate(start) #drop it so new records do not get appended to the broken line
+            break
+          if not line.endswith(b'\n'): #a crash came right before the newline, the record itself is whole
+            journal.write(b'\n') #finish it so the next record does not get appended to the same line
+          if start == 0 and (op["generation"] if isinstance(op, dict) else 0) < generation:
+            stale = True #a crash came between writing the snapshot and removing this journal, which is already in it
+            break
+          if isinstance(op, dict): #the generation line
+            continue
+          apply_op(list, op)
+          count += 1
+        metrics.count('storage_reads_total', kind='journal')
+        metrics.count('storage_read_bytes_total', journal.tell(), kind='journal')
+      if stale:
+        os.remove(filename + '.journal')
+    self.lengths[filename] = count
+    self.generations[filename] = generation
+    return list
+
+  def save(self, filename, list, ops):
+    """Function to append OPS to the journal of FILENAME. If OPS is None (we do
+    not know what changed) or the journal got too long, LIST is compacted into a snapshot."""
+    if ops is None or self.lengths.get(filename, 0) + len(ops) > self.compact_every:
+      self.compact(filename, list)
+      return
+    os.makedirs(os.path.dirname(filename) or '.', exist_ok=True) #the owner's folder may be new
+    text = ''.join(json.dumps(op) + '\n' for op in ops)
+    if not os.path.isfile(filename + '.journal') or not os.path.getsize(filename + '.journal'): #a new journal, for the snapshot on disk now
+      text = json.dumps({"generation": self.generations.get(filename, 0)}) + '\n' + text
+    with open(filename + '.journal', 'a') as journal:
+      journal.write(text)
+    metrics.count('storage_writes_total', kind='journal')
+    metrics.count('storage_write_bytes_total', len(text), kind='journal')
+    self.lengths[filename] = self.lengths.get(filename, 0) + len(ops)
+
+  def compact(self, filename, list):
+    """Function to write LIST as the snapshot of FILENAME and empty its journal.
+    The snapshot gets a newer generation than any journal so far, so if we crash in between,
+    load() sees that the old journal is already in it and does not replay it. That matters because
+    a whole-list save may have dropped tasks without any delete records."""
+    generation = max(time.time_ns(), self.generations.get(filename, 0) + 1) #also newer than the journals of earlier runs
+    list_write_atomic(filename, list.to_json() + [{"journal": generation}])
+    if os.path.isfile(filename + '.journal'):
+      os.remove(filename + '.journal')
+    self.lengths[filename] = 0
+    self.generations[filename] = generation
+
+  def mtime(self, filename):
+    """Function to return when the snapshot or the journal of FILENAME last changed, or None if neither exists"""
+    return max((os.path.getmtime(each) for each in (filename, filename + '.journal') if os.path.isfile(each)), default=None)
+
+  def remove(self, filename):
+    """Function to delete the snapshot and the journal of FILENAME"""
+    for each in (filename, filename + '.journal'):
+      if os.path.isfile(each):
+        os.remove(each)
+    self.lengths.pop(filename, None)
+    self.generations.pop(filename, None)
+
+BACKENDS = {'json': JsonBackend, 'journal': JournalBackend}
+
+class TaskStore:
+  """Class that keeps the daily lists and templates in memory, keyed by their filename.
+  Reads are served from memory after the first load from BACKEND. Writes only update
+  the cached list and mark it dirty; flush() then saves every dirty list once,
+  no matter how many times it was changed in between.
+
+  The bot uses the async functions (preload, aflush, run), which do their disk work on a
+  small thread pool of IO_WORKERS threads so the event loop never waits on the disk.
+  Once preload() is done, the plain functions below only touch memory. Anything that reads
+  and then changes a list across an await should hold lock(filename) while doing so."""
+
+  def __init__(self, backend, io_workers=4):
+    self.backend = backend
+    self.lists = {} #filename -> list, or None if there is no such file
+    self.dirty = {} #filename -> journal records changed since the last flush, or None if unknown
+    self.locks = {} #filename -> asyncio.Lock
+    self.mtimes = {} #filename -> when it last changed on disk, as of our last read or save
+    self.executor = ThreadPoolExecutor(max_workers=io_workers)
+
+  def fetch(self, filename):
+    """Function to read FILENAME straight from the backend. Returns None if it does not exist"""
+    self.mtimes[filename] = self.backend.mtime(filename) #first, so a change made while loading is noticed later
+    if self.backend.exists(filename):
+      return self.backend.load(filename)
+    return None
+
+  def lock(self, filename):
+    """Function to return the asyncio lock guarding FILENAME"""
+    if filename not in self.locks:
+      self.locks[filename] = asyncio.Lock()
+    return self.locks[filename]
+
+  async def run(self, function, *args):
+    """Function to run FUNCTION(*ARGS) on the thread pool and return its result"""
+    return await asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+
+  async def preload(self, *filenames):
+    """Function to make sure every list in FILENAMES is cached, reading the missing ones in parallel"""
+    missing = [filename for filename in filenames if filename not in self.lists]
+    metrics.count('store_cache_total', len(filenames) - len(missing), result='hit')
+    metrics.count('store_cache_total', len(missing), result='miss')
+    results = await asyncio.gather(*(self.run(self.fetch, filename) for filename in missing))
+    for filename, list in zip(missing, results):
+      self.lists.setdefault(filename, list) #someone else may have loaded or made it meanwhile
+
+  async def aflush(self):
+    """Function to save every dirty list like flush(), but on the thread pool.
+    Each list is saved while holding its lock, so nobody changes it halfway through.
+    Lists that fail to save stay dirty, and the first error is raised once the others are saved."""
+    dirty, self.dirty = self.dirty, {} #changes made from now on go into the next flush
+    results = await asyncio.gather(*(self.asave(filename, ops) for filename, ops in dirty.items()), return_exceptions=True)
+    failed = [(filename, error) for filename, error in zip(dirty, results) if isinstance(error, BaseException)]
+    for filename, error in failed:
+      self.dirty[filename] = None #some records may not have made it, so the next save writes the whole list
+    if failed:
+      raise failed[0][1]
+
+  async def asave(self, filename, ops):
+    """Function to save FILENAME with its journal records OPS on the thread pool"""
+    async with self.lock(filename):
+      await self.run(self.save, filename, self.lists[filename], ops)
+
+  def save(self, filename, list, ops):
+    """Function to save LIST as FILENAME with the backend and remember when that was"""
+    self.backend.save(filename, list, ops)
+    self.mtimes[filename] = self.backend.mtime(filename)
+
+  async def revalidate(self, filename):
+    """Function to read FILENAME again if its file was changed by something other than us
+    since we last read or saved it. Lists with unsaved changes are kept as they are."""
+    if filename not in self.lists or filename in self.dirty or self.lock(filename).locked():
+      return
+    if await self.run(self.backend.mtime, filename) == self.mtimes.get(filename):
+      return
+    list = await self.run(self.fetch, filename)
+    if filename not in self.dirty: #nobody changed it while we were reading
+      metrics.count('store_reloads_total')
+      self.lists[filename] = list
+
+  def load(self, filename):
+    """Function to make sure FILENAME is cached, reading it from disk on the first access"""
+    if filename not in self.lists:
+      metrics.count('store_cache_total', result='miss')
+      self.lists[filename] = self.fetch(filename) #None remembers that it is missing so we do not check again
+
+  def exists(self, filename):
+    """Function to check if a list named FILENAME exists"""
+    self.load(filename)
+    return self.lists[filename] is not None
+
+  def read(self, filename):
+    """Function to return the list named FILENAME. Raises FileNotFoundError
+    if it does not exist, just like list_read would."""
+    self.load(filename)
+    if self.lists[filename] is None:
+      raise FileNotFoundError(filename)
+    return self.lists[filename]
+
+  def write(self, filename, list, op=None):
+    """Function to replace the list named FILENAME with LIST. OP is the journal record
+    describing the change, if there is one. Nothing is written to disk until flush() is called.
+    Returns LIST"""
+    self.lists[filename] = list
+    if op is None:
+      self.dirty[filename] = None #the whole list has to be saved
+    elif self.dirty.get(filename, []) is not None:
+      self.dirty[filename] = self.dirty.get(filename, []) + [op]
+    return list
+
+  def create(self, filename, content, status=0):
+    """Function to create a task in FILENAME. Returns the list"""
+    task = self.read(filename).add(content, status)
+    return self.write(filename, self.read(filename), ['create', task.id, content, status])
+
+  def delete(self, filename, id):
+    """Function to delete task ID from FILENAME. Returns the list, or None if ID was not found"""
+    new_list = delete_task(self.read(filename), id)
+    if new_list is not None:
+      self.write(filename, new_list, ['delete', id])
+    return new_list
+
+  def edit(self, filename, id, key, value):
+    """Function to set KEY of task ID in FILENAME to VALUE. Returns the list, or None if ID was not found"""
+    new_list = edit_task(self.read(filename), id, key, value)
+    if new_list is not None:
+      self.write(filename, new_list, ['edit', id, key, value])
+    return new_list
+
+  def toggle(self, filename, id):
+    """Function to toggle the status of task ID in FILENAME. Returns the list, or None if ID was not found"""
+    new_list = toggle_status(self.read(filename), id)
+    if new_list is not None:
+      self.write(filename, new_list, ['edit', id, 'status', new_list.get(id).status])
+    return new_list
+
+  def flush(self):
+    """Function to save every dirty list in one pass"""
+    for filename, ops in list(self.dirty.items()):
+      try:
+        self.save(filename, self.lists[filename], ops)
+      except BaseException:
+        self.dirty[filename] = None #some records may not have made it, so the next save writes the whole list
+        raise
+      del self.dirty[filename]
+
+store = TaskStore(JsonBackend()) #shared by everything below, start() can swap the backend
+
+class Archive:
+  """Class that keeps the lists of past days in one SQLite database, one row per task,
+  so questions about many days are answered by an index instead of by opening a file per day.
+  Dates are stored as YYYY-MM-DD so they sort and compare as text, and owners as their folder
+  relative to data_dir. Every function here may be called from the store's thread pool."""
+
+  def __init__(self):
+    self.connection = None
+    self.lock = threading.Lock() #one connection, shared by the threads
+    self.rolled = None #the day rollover() last moved every past list in for
+
+  def open(self, filename):
+    """Function to open (and create, if needed) the database FILENAME"""
+    os.makedirs(os.path.dirname(filename) or '.', exist_ok=True)
+    self.connection = sqlite3.connect(filename, check_same_thread=False)
+    self.connection.executescript("""
+      CREATE TABLE IF NOT EXISTS tasks (
+        owner TEXT NOT NULL, date TEXT NOT NULL, id INTEGER NOT NULL,
+        content TEXT NOT NULL, status INTEGER NOT NULL, due TEXT,
+        PRIMARY KEY (owner, date, id)) WITHOUT ROWID;
+      CREATE INDEX IF NOT EXISTS tasks_by_status ON tasks (owner, status, date);
+    """)
+
+  def add(self, days):
+    """Function to store DAYS, a list of (owner, date, TaskList), in one transaction.
+    A day that is already there is replaced."""
+    with self.lock, self.connection:
+      for owner, date, list in days:
+        self.connection.execute("DELETE FROM tasks WHERE owner = ? AND date = ?", (owner, date))
+        self.connection.executemany("INSERT INTO tasks VALUES (?, ?, ?, ?, ?, ?)",
+                                    [(owner, date, task.id, task.content, task.status, task.due) for task in list])
+
+  def tasks(self, owner, since, status=None, after=None, limit=25):
+    """Function to return up to LIMIT tasks of OWNER from SINCE on, newest day first, as
+    (date, id, content, status) rows. STATUS keeps only done (1) or undone (0) tasks.
+    AFTER is the (date, id) of the last row of the previous page."""
+    before = time.perf_counter()
+    query = "SELECT date, id, content, status FROM tasks WHERE owner = ? AND date >= ?"
+    values = [owner, since]
+    if status is not None:
+      query += " AND status = ?"
+      values.append(status)
+    if after is not None:
+      query += " AND (date < ? OR (date = ? AND id > ?))"
+      values += [after[0], after[0], after[1]]
+    query += " ORDER BY date DESC, id LIMIT ?"
+    with self.lock:
+      rows = self.connection.execute(query, values + [limit]).fetchall()
+    metrics.observe('archive_query_seconds', time.perf_counter() - before, query='tasks')
+    return rows
+
+  def counts(self, owner, since, width=10):
+    """Function to return (period, tasks, done) for OWNER from SINCE on, oldest first.
+    WIDTH is how much of the date makes up a period: 10 for days, 7 for months."""
+    before = time.perf_counter()
+    with self.lock:
+      rows = self.connection.execute("SELECT substr(date, 1, ?) AS period, COUNT(*), SUM(status) FROM tasks "
+                                     "WHERE owner = ? AND date >= ? GROUP BY period ORDER BY period",
+                                     (width, owner, since)).fetchall()
+    metrics.observe('archive_query_seconds', time.perf_counter() - before, query='counts')
+    return rows
+
+archive = Archive() #start() opens it
+
+data_dir = 'data' #root folder for every user's lists, start() can change it
+subscribers = {} #owner folder -> {"user": user id, "channel": channel id} to send reminders to
+
+def owner_dir(guild_id, user_id):
+  """Function to return the folder holding the lists of user USER_ID in server GUILD_ID.
+  GUILD_ID is None for direct messages. Looks like data/guilds/<guild>/users/<user>"""
+  return os.path.join(data_dir, 'guilds', str(guild_id) if guild_id else 'dm', 'users', str(user_id))
+
+async def subscribe(owner, user_id, channel_id):
+  """Function to remember that OWNER should be reminded as USER_ID in CHANNEL_ID.
+  The subscribers file is only rewritten when this changes something."""
+  entry = {"user": user_id, "channel": channel_id}
+  if subscribers.get(owner) != entry:
+    subscribers[owner] = entry
+    filename = os.path.join(data_dir, 'subscribers')
+    async with store.lock(filename): #two saves at once would share the same temporary file
+      await store.run(list_write_atomic, filename, dict(subscribers))
+
+def load_subscribers():
+  """Function to read the subscribers file back in, if there is one"""
+  filename = os.path.join(data_dir, 'subscribers')
+  if os.path.isfile(filename):
+    subscribers.update(list_read(filename))
+
+def past_days(curr_date):
+  """Function to find the daily lists of every user from before CURR_DATE (MM-DD-YYYY).
+  Returns their filenames"""
+  curr_date = dt.strptime(curr_date, "%m-%d-%Y")
+  found = set()
+  for server in os.scandir(os.path.join(data_dir, 'guilds')) if os.path.isdir(os.path.join(data_dir, 'guilds')) else []:
+    users = os.path.join(server.path, 'users')
+    for user in os.scandir(users) if os.path.isdir(users) else []:
+      for each in os.scandir(user.path):
+        name = each.name.removesuffix('.journal')
+        if re.fullmatch(r'\d\d-\d\d-\d{4}', name) and dt.strptime(name, "%m-%d-%Y") < curr_date: #not the ones made ahead of time
+          found.add(os.path.join(user.path, name))
+  return sorted(found)
+
+def archive_days(filenames):
+  """Function to move the daily lists FILENAMES into the archive, then delete their files.
+  A file that cannot be read is renamed to end in .broken, so it is kept for a person to look at
+  but no longer picked up, and the others are moved anyway. Runs on the thread pool. Returns how many were moved"""
+  days, moved = [], []
+  for filename in filenames:
+    owner, date = os.path.split(filename)
+    try:
+      days.append((os.path.relpath(owner, data_dir), dt.strptime(date, "%m-%d-%Y").strftime("%Y-%m-%d"), store.fetch(filename) or TaskList()))
+      moved.append(filename)
+    except (ValueError, OSError): #a crash cut the file short, or it was edited by hand
+      log.exception("Could not archive %s, renaming it to %s.broken", filename, filename)
+      metrics.count('archive_errors_total')
+      for suffix in ('', '.journal'):
+        if os.path.isfile(filename + suffix):
+          os.replace(filename + suffix, filename + '.broken' + suffix)
+  archive.add(days)
+  for filename in moved: #only once they are safely in the archive
+    store.backend.remove(filename)
+  return len(days)
+
+async def rollover():
+  """Function to move every past daily list into the archive, once per day.
+  Lists that are being changed right now are left for the next call."""
+  curr_date = get_time("%m-%d-%Y")
+  if archive.rolled == curr_date:
+    return
+  await store.aflush()
+  found = await store.run(past_days, curr_date)
+  busy = [filename for filename in found if filename in store.dirty or (filename in store.locks and store.locks[filename].locked())]
+  moved = [filename for filename in found if filename not in busy]
+  if moved:
+    metrics.count('archived_days_total', await store.run(archive_days, moved))
+  for filename in moved:
+    if filename not in store.dirty: #changed meanwhile, it will be saved and moved again next time
+      store.lists.pop(filename, None)
+  if not busy:
+    archive.rolled = curr_date
 
 def get_time(arg):
   """Function to get details of the current date and time.
@@ -45,43 +768,35 @@ def get_time(arg):
   # ..."%M" -> '30' (minute)
   return dt.now().strftime(arg)
 
-def get_task():
-  """Function to read tasks list from storage"""
+def get_task(owner):
+  """Function to read the tasks list of OWNER from storage"""
   now_date = get_time("%m-%d-%Y")
-  return list_read(now_date)
+  return store.read(os.path.join(owner, now_date))
 
 def create_task(list, content, status=0):
-  """Function that creates a task. Takes in a CONTENT (string), STATUS (string)).
-  Status (0 for not done, 1 for done) defaults to 0."""
-  if list: #nonempty list
-    id = max(list)[0] + 1
-  else: #empty list
-    id = 0 #start the ids from 0
-  return list + [ [id, [{"content": content}, {"status": status}]] ]
+  """Function that creates a task in the TaskList LIST. Takes in a CONTENT (string), STATUS (string)).
+  Status (0 for not done, 1 for done) defaults to 0. LIST is changed in place and returned."""
+  list.add(content, status)
+  return list
 
 def delete_task(list, id):
-  """Function to delete the task correlated to id ID in task list"""
-  list_copy = list[:] #create a copy
-  for sublist in list_copy: #loop through each individual sublist
-    if sublist[0] == id: #ids should be the first item in the list
-      list_copy.remove(sublist) #delete
-  if list == list_copy:
+  """Function to delete the task correlated to id ID in task list.
+  Returns LIST, or None if there was no such task"""
+  if not list.remove(id):
     return None #nothing changed
-  return list_copy #return what we have left
+  return list #return what we have left
 
 def edit_attr(list, id, key, edit):
   """Function that checks for task with ID in LIST,
-  then change the value given a KEY for the dictionary.
-  This is done by passing in a function to EDIT."""
-  list_copy = copy.deepcopy(list) #need to do a deep copy to handle nested dicts
-  for sublist in list_copy: #loop through each individual sublist
-    if sublist[0] == id: #ehck the ids
-      for dict in sublist[1]: #then loop through the dicts
-        if key in dict: #finding the key
-          dict[key] = edit(dict[key]) #run edit() on the value
-  if list == list_copy:
+  then change the value given a KEY (an attribute of Task).
+  This is done by passing in a function to EDIT.
+  Returns LIST, or None if there was no such task or key"""
+  task = list.get(id)
+  if task is None or key == 'id' or key not in Task.__slots__:
     return None #nothing changed
-  return list_copy #return what we have left
+  setattr(task, key, edit(getattr(task, key))) #run edit() on the value
+  list.version += 1
+  return list
 
 def toggle_status(list, id):
   """Function to toggle a task as done (1) or not done (0)"""
@@ -91,295 +806,1268 @@ def edit_task(list, id, key, value):
   """Function to change the VALUE of a KEY of a task"""
   return edit_attr(list, id, key, lambda x: value) #lambda just returns VALUE
 
-def create_template(date, tasks):
-  """Function that takes in a list of TASKS to create for a DATE template.
+def merge_template(template, list):
+  """Function to return a new TaskList with the compiled TEMPLATE (see Templates.compile) first,
+  then the tasks of LIST. Tasks of LIST keep their ids, so anything pointing at them (like a
+  reminder) still works, and template tasks are numbered after them, each at the same offset
+  from LIST's next free id as in the template. One pass over each, nothing is searched."""
+  entries, next_id = template
+  new_list = TaskList()
+  for id, content, status, due in entries:
+    new_list.add(content, status, list.next_id + id, due)
+  for task in list:
+    new_list.add(task.content, task.status, task.id, task.due)
+  new_list.next_id = list.next_id + next_id
+  return new_list
+
+class Templates:
+  """Class that keeps every weekday template compiled into a tuple of (id, content, status, due)
+  entries and its next free id, ready for merge_template. A compiled template is made again when the
+  template changes, through the store (its TaskList is replaced or its version goes up) or on disk
+  (its modification time changes, which refresh() checks at most every RECHECK seconds).
+  generate() makes daily lists from them, also for days ahead of time, and use() hands out today's list.
+  What every list made ahead of time looked like is saved to the pregenerated file (see save), so a list
+  nobody touched yet still follows its template after a restart."""
+
+  def __init__(self, recheck=5):
+    self.recheck = recheck
+    self.compiled = {} #template filename -> (TaskList it was compiled from, its version, compiled template)
+    self.checked = {} #template filename -> time.monotonic() of the last look at its file
+    self.generated = {} #filename of a list made ahead of time and not used yet -> the list as it was made, in its on-disk form
+    self.generated_on = None #the day pregenerate() last ran for
+    self.changed = False #whether the pregenerated file is out of date
+
+  def load(self, filename):
+    """Function to read back what save() wrote to FILENAME, if there is such a file"""
+    if os.path.isfile(filename):
+      self.generated.update(list_read(filename))
+    self.changed = False
+
+  async def save(self, filename):
+    """Function to write which lists were made ahead of time to FILENAME, if that changed"""
+    if self.changed:
+      self.changed = False
+      try:
+        await store.run(list_write_atomic, filename, dict(self.generated))
+      except BaseException:
+        self.changed = True #try again next time
+        raise
+
+  async def refresh(self, filename):
+    """Function to make sure template FILENAME is cached and the same as on disk"""
+    if filename not in store.lists:
+      await store.preload(filename)
+      self.checked[filename] = time.monotonic()
+    elif time.monotonic() - self.checked.get(filename, float('-inf')) >= self.recheck:
+      self.checked[filename] = time.monotonic()
+      await store.revalidate(filename)
+
+  def compile(self, filename):
+    """Function to return the compiled template FILENAME, which is empty if there is no such template"""
+    list = store.read(filename) if store.exists(filename) else TaskList()
+    cached = self.compiled.get(filename)
+    if cached is None or cached[0] is not list or cached[1] != list.version:
+      metrics.count('template_compiles_total')
+      cached = self.compiled[filename] = (list, list.version, (tuple((task.id, task.content, task.status, task.due) for task in list), list.next_id))
+    return cached[2]
+
+  def generate(self, owner, date, ahead=False):
+    """Function to return the daily list of OWNER for DATE (MM-DD-YYYY), making it from the template
+    for its day of the week if it does not exist. A list that was made ahead of time is made again
+    if its template changed since and nobody touched the list. AHEAD says that DATE is not today yet."""
+    filename = os.path.join(owner, date)
+    if store.exists(filename):
+      list = store.read(filename)
+      made = self.generated.get(filename)
+      if made is None or list.to_json() != made:
+        return list #not made ahead of time, or theirs now
+      new_list = merge_template(self.compile(os.path.join(owner, dt.strptime(date, "%m-%d-%Y").strftime("%A"))), TaskList())
+      if new_list.to_json() == made:
+        return list #still up to date
+      log.debug("Template changed since %s was made ahead of time. Making it again...", filename)
+    else:
+      log.debug("Daily list %s non existent. Creating...", filename)
+      new_list = merge_template(self.compile(os.path.join(owner, dt.strptime(date, "%m-%d-%Y").strftime("%A"))), TaskList())
+    list = store.write(filename, new_list)
+    if ahead:
+      self.generated[filename] = list.to_json()
+      self.changed = True
+    return list
+
+  def use(self, owner, date):
+    """Function to return the daily list of OWNER for today's DATE like generate(), and mark it as theirs from now on,
+    so later template changes no longer reach it. Due times that came with it from the template are scheduled."""
+    filename = os.path.join(owner, date)
+    existed = store.exists(filename)
+    list = self.generate(owner, date)
+    if self.generated.pop(filename, None) is not None:
+      self.changed = True
+    elif existed:
+      return list #first used before, its due times were scheduled then
+    schedule_due(owner, date, list)
+    return list
+
+  async def pregenerate(self, days):
+    """Function to make the daily lists of every subscriber for the next DAYS days, once per day,
+    so the first command of the day does not have to. Days whose template is empty are skipped."""
+    curr_date = get_time("%m-%d-%Y")
+    if self.generated_on == curr_date or days <= 0:
+      return
+    self.generated_on = curr_date
+    for filename in [filename for filename in self.generated if dt.strptime(os.path.basename(filename), "%m-%d-%Y") < dt.strptime(curr_date, "%m-%d-%Y")]:
+      del self.generated[filename] #never used, and archived by now
+      self.changed = True
+    dates = [(dt.now() + timedelta(days=ahead)).strftime("%m-%d-%Y") for ahead in range(1, days + 1)]
+    for owner in list(subscribers):
+      await store.preload(*{os.path.join(owner, dt.strptime(date, "%m-%d-%Y").strftime("%A")) for date in dates})
+      #a day without a template gets an empty list, which the first command of that day makes just as fast,
+      #so only write the ones that get tasks, or that were made ahead of time before and may have to change
+      wanted = [date for date in dates if self.compile(os.path.join(owner, dt.strptime(date, "%m-%d-%Y").strftime("%A")))[0]
+        or os.path.join(owner, date) in self.generated]
+      await store.preload(*[os.path.join(owner, date) for date in wanted])
+      for date in wanted:
+        async with store.lock(os.path.join(owner, date)):
+          self.generate(owner, date, ahead=True)
+    await store.aflush()
+
+templates = Templates()
+
+def create_template(owner, date, tasks):
+  """Function that takes in a list of TASKS to create for a DATE template of OWNER.
   TASKS should be a list of the content of the tasks you want."""
-  assert date == 'Sunday' or date == 'Monday' or date == 'Tuesday' or date == 'Wednesday' or date == 'Thursday' or date == 'Wednesday' or date == 'Thursday' or date == 'Friday' or date == 'Saturday', 'date should be a day of the week (Monday, Tuesday, etc.)'
-  if os.path.isfile(date): #make sure we have a file
-    template_list = list_read(date)
-  else:
-    template_list = [] #init a blank list
+  assert date in DAYS, 'date should be a day of the week (Monday, Tuesday, etc.)'
+  filename = os.path.join(owner, date)
+  if not store.exists(filename): #make sure we have a file
+    store.write(filename, TaskList()) #init a blank list
   for each in tasks: #iterate over the list TASKS
-    template_list = create_task(template_list, each) #keep appending
-  return list_write(date, template_list) #write it to disk as DATE
+    store.create(filename, each) #keep appending
+  return store.read(filename)
 
-def edit_template(date, id, key, value):
+def edit_template(owner, date, id, key, value):
   """Function to read a template, edit it, then save it.
-  Takes in DATE, which is the name of the template, ID
+  Takes in OWNER and DATE, which is the name of the template, ID
   of the task, KEY and VALUE to replace"""
-  if os.path.isfile(date):
-    return edit_task(list_read(date), id, key, value) #call edit_task
+  filename = os.path.join(owner, date)
+  if store.exists(filename):
+    return store.edit(filename, id, key, value) #returns None if ID was not found
 
-def delete_template(date, id):
-  """Function to read a template, then delete task ID from it."""
-  if os.path.isfile(date):
-    return delete_task(list_read(date), id) #call delete_task, return the edited list
+def delete_template(owner, date, id):
+  """Function to read a template of OWNER, then delete task ID from it and save it."""
+  filename = os.path.join(owner, date)
+  if store.exists(filename):
+    return store.delete(filename, id) #return the edited list, or None if ID was not found
 
 def make_text(list):
-  """Function to make a more human-readable output of the task LIST"""
-  text = '' #init a blank string
+  """Function to make a more human-readable output of the task LIST.
+  The result is kept on LIST until it changes, so showing it again is free."""
   if not list:
     return 'No tasks found!\n' #saves from executing below
-  for each in list:
-    id = each[0] #get id
-    content = None #preset these
-    status = None
-    for dict in each[1]: #then loop through the dicts
-      if 'content' in dict: #finding the content
-        content = dict['content']
-      elif 'status' in dict: #and now the status
-        if not dict['status']:
-          status = 'x' #x mark
-        else:
-          status = '✓' #check mark
-      if content and status: #when we get both
-        text += f"[{status}] {content} - (ID: {id})\n" #add them to string
+  if list.rendered is not None and list.rendered[0] == list.version:
+    metrics.count('render_cache_total', result='hit')
+    return list.rendered[1]
+  metrics.count('render_cache_total', result='miss')
+  text = ''.join(f"[{'✓' if task.status else 'x'}] {task.content}{f' (due {task.due})' if task.due else ''} - (ID: {task.id})\n" for task in list) #check mark or x mark
+  list.rendered = (list.version, text)
   return text
 
-def init_tasks():
-  """Function that returns a string showing what tasks there are to do, along with their status"""
-  curr_day = get_time("%A") #Monday, Tuesday, etc.
+def paginate(text, limit=2000):
+  """Function to split TEXT into pieces of at most LIMIT characters (the most Discord
+  allows in one message), breaking between lines where possible."""
+  pages = []
+  page = ''
+  for line in text.splitlines(keepends=True):
+    while len(line) > limit: #a single line that does not fit anywhere
+      if page:
+        pages.append(page)
+        page = ''
+      pages.append(line[:limit])
+      line = line[limit:]
+    if len(page) + len(line) > limit:
+      pages.append(page)
+      page = ''
+    page += line
+  if page:
+    pages.append(page)
+  return pages
+
+def init_tasks(owner):
+  """Function that returns a string showing what tasks OWNER has to do, along with their status"""
   curr_date = get_time("%m-%d-%Y") #01/01/2021, etc.
-  #this logic loop will not append templates if they were created after the curr_date list.
+  #this will not append templates if they were changed after today's list was first used.
   #run load_template to do so
-  if not os.path.isfile(curr_date): #the current daily list is nonexistent
-    print("DEBUG: Daily list non existent. Creating...")
-    if os.path.isfile(curr_day): #then, if a template exists
-      print("DEBUG: Template for today was found. Adding to daily list...")
-      task_list = list_read(curr_day) #first stick in the template
-    else:
-      task_list = [] #just make an empty list
-    list_write(curr_date, task_list) #save
-  else:
-      task_list = list_read(curr_date) #load normally
+  task_list = templates.use(owner, curr_date) #made from today's template if it does not exist yet
   text = make_text(task_list)
   return f"Here is your list of tasks to complete today:\n\n{text}"
 
-def load_template():
-  """Function that loads in a template if today's task list was created before the template was.
-  First creates an empty list using the new template, then loops through the existing task list
-  and appends it to the list. Saves this all back into the daily list.
-  Returns a string of text as a message."""
-  curr_day = get_time("%A") #Monday, Tuesday, etc.
-  curr_date = get_time("%m-%d-%Y") #01/01/2021, etc.
-  if os.path.isfile(curr_date) and os.path.isfile(curr_day):
-    new_list = list_read(curr_day)
-    if new_list == []:
-      return f"Template {curr_day} is empty. No action taken."
+def load_template(owner):
+  """Function that loads in a template of OWNER if today's task list was created before the template was.
+  The template's tasks are put in front of today's tasks (see merge_template), and the result
+  is saved back into the daily list. Returns a string of text as a message."""
+  day = get_time("%A") #Monday, Tuesday, etc.
+  curr_day = os.path.join(owner, day)
+  curr_date = os.path.join(owner, get_time("%m-%d-%Y")) #01/01/2021, etc.
+  if store.exists(curr_date) and store.exists(curr_day):
+    template = templates.compile(curr_day)
+    if not template[0]:
+      return f"Template {day} is empty. No action taken."
     else:
-      for each in list_read(curr_date):
-        dicts_list = each[1]
-        id = max(new_list)[0] + 1
-        new_list = new_list + [ [id, dicts_list] ]
-      list_write(curr_date, new_list)
-      return f"Daily task list had been edited to include tasks from the template for {curr_day}."
+      store.write(curr_date, merge_template(template, store.read(curr_date))) #today's tasks keep their ids
+      return f"Daily task list had been edited to include tasks from the template for {day}."
   else:
     return 'Missing either the template or daily tasks list.'  #load_template was called when certain requirements were not met
 
 ### Discord bot portion ###
 
+class SessionTimeout(Exception):
+  """Raised by Sessions.ask when the user does not reply in time"""
+
+class Sessions:
+  """Class that routes follow-up messages to the conversation that asked for them.
+  A conversation is keyed by (channel id, author id), so every user can be in the middle of
+  their own command in every channel at once. The coroutine running a command is the state
+  of its conversation: it calls ask(), waits for the reply, then moves on to the next step.
+  An incoming message is matched to its conversation with one dict lookup."""
+
+  def __init__(self, timeout=120):
+    self.timeout = timeout #seconds to wait for a reply
+    self.waiting = {} #(channel id, author id) -> future the reply is put into
+
+  def key(self, message):
+    """Function to return the conversation key of MESSAGE"""
+    return (message.channel.id, message.author.id)
+
+  def dispatch(self, message):
+    """Function to hand MESSAGE to the conversation waiting on it.
+    Returns True if there was one, False if MESSAGE should be handled as usual."""
+    future = self.waiting.pop(self.key(message), None)
+    if future is None or future.done():
+      return False
+    future.set_result(message)
+    return True
+
+  async def ask(self, message, question):
+    """Function to send QUESTION in reply to MESSAGE and wait for the same author to answer
+    in the same channel. Returns the answer, or raises SessionTimeout after self.timeout seconds."""
+    await send_text(message.channel, question)
+    key = self.key(message)
+    future = asyncio.get_running_loop().create_future()
+    self.waiting[key] = future
+    timing = current_command.get()
+    if timing is not None and timing["profiler"] is not None:
+      metrics.pause_profile(timing["profiler"]) #nothing of ours to see while the user types
+    before = time.perf_counter()
+    try:
+      return await asyncio.wait_for(future, self.timeout)
+    except asyncio.TimeoutError:
+      raise SessionTimeout() from None
+    finally:
+      if self.waiting.get(key) is future: #do not remove a newer conversation
+        del self.waiting[key]
+      if timing is not None:
+        waited = time.perf_counter() - before
+        timing["waited"] += waited
+        metrics.observe('reply_wait_seconds', waited, command=timing["name"])
+        if timing["profiler"] is not None:
+          metrics.resume_profile(timing["profiler"])
+
+sessions = Sessions()
+current_command = contextvars.ContextVar('current_command', default=None) #{"name", "waited", "profiler"} of the command being run, see timed
+
+async def timed(name, coroutine):
+  """Function to await COROUTINE, which runs command NAME, and record how long the bot spent on it
+  in command_seconds. Time spent waiting for the user to reply (see Sessions.ask) is left out of it
+  and recorded in reply_wait_seconds instead. PROFILE_RATE of the commands are also sampled with cProfile."""
+  timing = {"name": name, "waited": 0, "profiler": metrics.sample_profile()}
+  current_command.set(timing) #only seen by this task, every message is handled in its own
+  before = time.perf_counter()
+  try:
+    return await coroutine
+  finally:
+    if timing["profiler"] is not None:
+      metrics.add_profile(timing["profiler"])
+    metrics.observe('command_seconds', time.perf_counter() - before - timing["waited"], command=name)
+
+class Scheduler:
+  """Class that keeps every upcoming reminder in one heap, ordered by when it is due.
+  run() sleeps until the earliest one with a single timer instead of polling, and is woken
+  early when something sooner gets scheduled. Heap entries are [when, sequence, kind, owner, target];
+  rescheduling or cancelling a reminder marks its old entry dead (kind None) instead of
+  searching the heap for it. Reminders are moved out of the quiet hours (see next_allowed)."""
+
+  def __init__(self):
+    self.heap = []
+    self.entries = {} #(kind, owner, target) -> its live heap entry
+    self.sequence = itertools.count() #breaks ties, so entries are never compared past it
+    self.quiet = None #(start hour, end hour) to stay silent in, or None
+    self.wakeup = None #asyncio.Event, made by run() on the bot's event loop
+    self.changed = False #whether the reminders file is out of date
+
+  def next_allowed(self, when):
+    """Function to return the first timestamp at or after WHEN that is not in the quiet hours.
+    The quiet hours include the whole end hour, and may wrap past midnight (e.g. 22 to 6)."""
+    if self.quiet is None:
+      return when
+    start, end = self.quiet
+    moment = dt.fromtimestamp(when)
+    if start <= end:
+      quiet = start <= moment.hour <= end
+    else: #wraps past midnight
+      quiet = moment.hour >= start or moment.hour <= end
+    if not quiet:
+      return when
+    resume = moment.replace(hour=(end + 1) % 24, minute=0, second=0, microsecond=0)
+    if resume <= moment: #the quiet hours end tomorrow
+      resume += timedelta(days=1)
+    return resume.timestamp()
+
+  def schedule(self, when, kind, owner, target=None):
+    """Function to schedule reminder KIND for OWNER (and TARGET) at timestamp WHEN,
+    or at the end of the quiet hours if WHEN falls inside them. Replaces the same reminder if it was already scheduled."""
+    self.cancel(kind, owner, target)
+    entry = [self.next_allowed(when), next(self.sequence), kind, owner, target]
+    heapq.heappush(self.heap, entry)
+    self.entries[(kind, owner, target)] = entry
+    self.changed = True
+    if self.heap[0] is entry and self.wakeup is not None:
+      self.wakeup.set() #run() is sleeping for too long now
+
+  def cancel(self, kind, owner, target=None):
+    """Function to drop reminder KIND for OWNER (and TARGET), if it is scheduled"""
+    entry = self.entries.pop((kind, owner, target), None)
+    if entry is not None:
+      entry[2] = None #dead, run() throws it away when it reaches the top
+      self.changed = True
+
+  def scheduled(self, kind, owner, target=None):
+    """Function to check if reminder KIND for OWNER (and TARGET) is scheduled"""
+    return (kind, owner, target) in self.entries
+
+  def dump(self):
+    """Function to return every live reminder as [when, kind, owner, target], for saving"""
+    return [[entry[0], entry[2], entry[3], entry[4]] for entry in self.entries.values()]
+
+  def load(self, filename):
+    """Function to schedule the reminders saved in FILENAME by dump(), if there is such a file"""
+    if os.path.isfile(filename):
+      for when, kind, owner, target in list_read(filename):
+        self.schedule(when, kind, owner, target)
+    self.changed = False
+
+  async def run(self, fire):
+    """Function that awaits FIRE(kind, owner, target) for every reminder as it comes due, forever"""
+    self.wakeup = asyncio.Event()
+    while True:
+      while self.heap and self.heap[0][2] is None:
+        heapq.heappop(self.heap) #throw away dead entries
+      delay = self.heap[0][0] - time.time() if self.heap else None
+      if delay is None or delay > 0:
+        self.wakeup.clear()
+        try:
+          await asyncio.wait_for(self.wakeup.wait(), delay) #sleeps forever if there is nothing to do
+        except asyncio.TimeoutError:
+          pass
+        continue
+      when, _, kind, owner, target = heapq.heappop(self.heap)
+      del self.entries[(kind, owner, target)]
+      self.changed = True
+      try:
+        await fire(kind, owner, target, when)
+      except Exception: #one broken reminder should not stop all the others
+        log.exception("Reminder %s for %s failed", kind, owner)
+        metrics.count('reminder_errors_total', kind=kind)
+
+scheduler = Scheduler()
+
+def reminders_file():
+  """Function to return where the scheduled reminders are saved"""
+  return os.path.join(data_dir, 'reminders')
+
+def schedule_due(owner, date, tasks):
+  """Function to schedule a 'task' reminder for every one of TASKS (in the list of OWNER for DATE, MM-DD-YYYY)
+  that has a due time later today and is not done yet"""
+  if date != get_time("%m-%d-%Y"):
+    return #only today's tasks get reminders
+  now = dt.now()
+  for task in tasks:
+    if task.due is not None and not task.status:
+      moment = now.replace(hour=int(task.due[:2]), minute=int(task.due[3:]), second=0, microsecond=0)
+      if moment > now:
+        scheduler.schedule(moment.timestamp(), 'task', owner, f"{date}:{task.id}")
+
+class Outbox:
+  """Class that queues everything the bot sends, one queue per channel, so a command or a
+  reminder never waits on Discord. Each channel's queue is emptied by its own worker, which
+  sends at most RATE messages every PER seconds (Discord's limit per channel) and merges queued
+  texts into one message while they fit in LIMIT characters.
+  Reminders go through remind(), which skips a reminder that is the same as the last one,
+  and can edit the last reminder in place instead of posting a new one."""
+
+  def __init__(self, rate=5, per=5, limit=2000):
+    self.rate, self.per, self.limit = rate, per, limit
+    self.queues = {} #channel id -> deque of [text, message to edit or None, reminder key or None, discord.File or None]
+    self.workers = {} #channel id -> the task emptying its queue
+    self.sent = {} #channel id -> times of the last RATE sends
+    self.reminders = {} #reminder key -> [hash of its text, the message it was posted as]
+
+  def send(self, channel, text, edit=None, key=None, file=None):
+    """Function to queue TEXT for CHANNEL. If EDIT is a message, it is edited to TEXT instead.
+    KEY marks the message as the latest reminder for remind(). FILE is attached to the message."""
+    if channel.id not in self.queues:
+      self.queues[channel.id] = deque()
+      self.workers[channel.id] = asyncio.create_task(self.work(channel))
+    self.queues[channel.id].append([text, edit, key, file])
+
+  def remind(self, channel, owner, text, edit=False):
+    """Function to queue reminder TEXT for OWNER in CHANNEL. Nothing is sent if TEXT is the same
+    as the last reminder there. If EDIT is True, the last reminder is edited instead, when it fit in one message."""
+    key = (channel.id, owner)
+    digest = hashlib.sha1(text.encode()).hexdigest()
+    last = self.reminders.get(key)
+    if last is not None and last[0] == digest:
+      return False #nothing changed since the last one
+    previous = last[1] if last is not None else None
+    pages = paginate(text, self.limit)
+    self.reminders[key] = [digest, previous if len(pages) == 1 else None] #the worker fills in the new message
+    if edit and previous is not None and len(pages) == 1:
+      self.send(channel, pages[0], edit=previous, key=key)
+    else:
+      for page in pages[:-1]:
+        self.send(channel, page)
+      self.send(channel, pages[-1], key=key if len(pages) == 1 else None) #only single messages can be edited later
+    return True
+
+  async def pace(self, channel_id):
+    """Function that waits until another message can be sent to CHANNEL_ID without going over the rate limit"""
+    sent = self.sent.setdefault(channel_id, deque(maxlen=self.rate))
+    if len(sent) == self.rate:
+      wait = sent[0] + self.per - time.monotonic()
+      if wait > 0:
+        await asyncio.sleep(wait)
+    sent.append(time.monotonic())
+
+  async def work(self, channel):
+    """Function that empties the queue of CHANNEL, then stops"""
+    queue = self.queues[channel.id]
+    try:
+      while queue:
+        text, edit, key, file = queue.popleft()
+        while edit is None and key is None and file is None and queue and queue[0][1:] == [None, None, None] \
+            and len(text) + 1 + len(queue[0][0]) <= self.limit:
+          text += '\n' + queue.popleft()[0] #merge plain messages that fit together
+        await self.pace(channel.id)
+        try:
+          if edit is not None:
+            try:
+              await edit.edit(content=text)
+              message = edit
+            except discord.HTTPException: #most likely deleted, so post it again
+              message = await channel.send(text)
+          elif file is not None:
+            message = await channel.send(text, file=file)
+          else:
+            message = await channel.send(text)
+        except discord.HTTPException as error:
+          log.warning("Could not send to channel %s: %s", channel.id, error)
+          metrics.count('send_errors_total')
+          continue
+        if key is not None and key in self.reminders:
+          self.reminders[key][1] = message #the one to edit next time
+    finally:
+      del self.queues[channel.id], self.workers[channel.id]
+
+outbox = Outbox()
+
+metrics.gauge('cached_lists', lambda: len(store.lists))
+metrics.gauge('waiting_replies', lambda: len(sessions.waiting))
+metrics.gauge('scheduled_reminders', lambda: len(scheduler.entries))
+metrics.gauge('outbox_queued_messages', lambda: sum(len(queue) for queue in outbox.queues.values()))
+
+async def send_text(channel, text):
+  """Function to send TEXT to CHANNEL, split over as many messages as it needs (see paginate).
+  The messages are queued on the outbox, so this returns before they are sent."""
+  for page in paginate(text):
+    outbox.send(channel, page)
+
+PREFIX = ',' #every command starts with this
+DAYS = ['Sunday', 'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday']
+COMMANDS = {} #command name without the prefix -> handler
+
+def command(*names):
+  """Decorator that registers a command handler under every name in NAMES.
+  Handlers are called as handler(message, owner, args), where ARGS is whatever
+  followed the command name, and return the response to send.
+  The first name is the one the handler's metrics are kept under."""
+  def register(handler):
+    handler.name = names[0]
+    for name in names:
+      COMMANDS[name] = handler
+    return handler
+  return register
+
+def parse_command(content):
+  """Function to split the CONTENT of a message into (name, args).
+  Returns None if it does not start with PREFIX"""
+  if not content.startswith(PREFIX):
+    return None
+  name, args = split_first(content[len(PREFIX):]) #any whitespace ends the name, so the args may start on the next line
+  if not name:
+    return None
+  return name.lower(), args.strip()
+
+def split_first(text):
+  """Function to split TEXT into (first word, the rest) at any whitespace, not just spaces.
+  Either is '' if it is missing"""
+  parts = text.split(None, 1)
+  return (parts[0] if parts else ''), (parts[1] if len(parts) > 1 else '')
+
+def split_items(text):
+  """Function to split TEXT on semi-colons into a list of non-empty items"""
+  return [each.strip() for each in text.split(';') if each.strip()]
+
+def today(owner):
+  """Function to return the filename of today's list of OWNER"""
+  return os.path.join(owner, get_time("%m-%d-%Y"))
+
+async def ask_day(message, args, question):
+  """Function to get the day a template command is about from the start of ARGS,
+  asking QUESTION if ARGS is empty. Returns (day, rest of ARGS), where day is None
+  if it is not one of DAYS."""
+  day, rest = split_first(args)
+  if not day:
+    day = (await sessions.ask(message, question)).content.strip()
+  day = day.capitalize() #monday and MONDAY are fine too
+  return (day if day in DAYS else None), rest.strip()
+
+@command('help')
+async def help_command(message, owner, args):
+  """Function that lists every command"""
+  response = f"Commands available to manage tasks are '{PREFIX}create_task', '{PREFIX}edit_task', '{PREFIX}delete_task', '{PREFIX}show_task', and '{PREFIX}toggle_status'."
+  response += f"\n- '{PREFIX}create_task' or '{PREFIX}cta' allows you to create daily tasks by providing their descriptions. Ex: {PREFIX}cta Wake up; Eat breakfast"
+  response += f"\n- '{PREFIX}edit_task' or '{PREFIX}eta' allows you to edit pre-existing daily tasks by overwriting their descriptions. Ex: {PREFIX}eta 1 Eat lunch"
+  response += f"\n- '{PREFIX}delete_task' or '{PREFIX}dta' allows you to delete pre-existing daily tasks. Ex: {PREFIX}dta 1; 2"
+  response += f"\n- '{PREFIX}show_task' or '{PREFIX}sta' allows you to view all daily tasks, as well as their statuses."
+  response += f"\n- '{PREFIX}toggle_status' or '{PREFIX}ts' allow you to toggle the status of a pre-existing daily task between done (✓) or not done (x). Ex: {PREFIX}ts 1"
+  response += f"\n- '{PREFIX}remind' or '{PREFIX}rt' sets the time a daily task is due, and reminds you about it then if it is not done yet. Ex: {PREFIX}rt 1 17:30 (or {PREFIX}rt 1 off)"
+  response += f"\n\nCommands to edit templates include '{PREFIX}create_template', '{PREFIX}edit_template', '{PREFIX}delete_template', '{PREFIX}show_template', and '{PREFIX}load_template'."
+  response += f"\n- '{PREFIX}create_template' or '{PREFIX}cte' allows you to create or add tasks to a template for a specific day of the week by providing their descriptions. Ex: {PREFIX}cte Monday Wake up; Go to work"
+  response += f"\n- '{PREFIX}edit_template' or '{PREFIX}ete' allows you to edit pre-existing template tasks by overwriting their descriptions. Ex: {PREFIX}ete Monday 1 Go to school"
+  response += f"\n- '{PREFIX}delete_template' or '{PREFIX}dte' allows you to delete pre-existing template tasks. Ex: {PREFIX}dte Monday 1; 2"
+  response += f"\n- '{PREFIX}show_template' or '{PREFIX}ste' allows you to view the templates for every day of the week."
+  response += f"\n- '{PREFIX}load_template' or '{PREFIX}lte' allows you to load in the tasks from a template, if you have already created your daily task beforehand."
+  response += f"\n\nCommands to move many tasks at once are '{PREFIX}import' and '{PREFIX}export'. Both work on 'today' (if left out), a day of the week, or 'templates' for all of them."
+  response += f"\n- '{PREFIX}import' adds the tasks of an attached .csv or .jsonl file, with a content column and optionally status, due and (for templates) day columns. Add 'replace' to replace the tasks instead. Ex: {PREFIX}import Monday"
+  response += f"\n- '{PREFIX}export' sends your tasks as a .csv file, or as a .jsonl file if you add 'jsonl'. Ex: {PREFIX}export templates jsonl"
+  response += f"\n\nCommands to look back at past days are '{PREFIX}history' and '{PREFIX}progress'. Both take a number of days or today, week, month, year or all (a week if left out)."
+  response += f"\n- '{PREFIX}history' or '{PREFIX}hy' lists past tasks, newest first, optionally only the done or undone ones. Ex: {PREFIX}history week undone"
+  response += f"\n- '{PREFIX}progress' or '{PREFIX}pg' shows how many tasks you finished each day, or each month for periods longer than a month. Ex: {PREFIX}progress month"
+  response += f"\n\n'{PREFIX}stats' shows how fast the bot is running. Only bot admins can use it."
+  response += "\n\nCommands that need more details will ask for them if you leave them out."
+  return response
+
+@command('show_task', 'show_tasks', 'sta')
+async def show_task_command(message, owner, args):
+  """Function that shows today's tasks"""
+  return init_tasks(owner)
+
+@command('create_task', 'cta')
+async def create_task_command(message, owner, args):
+  """Function that creates the tasks in ARGS, or asks for them"""
+  curr_date = today(owner)
+  if not args:
+    args = (await sessions.ask(message, "Please enter the description of the task you want to add. To add multiple tasks, separate each entry with a semi-colon. Ex: Wake up; Eat breakfast; etc.")).content
+  response = ""
+  async with store.lock(curr_date):
+    for each in split_items(args):
+      store.create(curr_date, each)
+      response += f"\nTask with description '{each}' has been created."
+  response += f"\n\nYour current list of tasks is as follows:\n\n{make_text(store.read(curr_date))}"
+  return response
+
+@command('delete_task', 'dta')
+async def delete_task_command(message, owner, args):
+  """Function that deletes the task ids in ARGS, or asks for them"""
+  curr_date = today(owner)
+  if not store.read(curr_date):
+    return f"The tasks list is empty or nonexistent. Create one now using '{PREFIX}create_task'."
+  if not args:
+    await send_text(message.channel, make_text(store.read(curr_date)))
+    args = (await sessions.ask(message, "Please enter the ID number of the task you want to delete. To delete multiple tasks, separate each id with a semi-colon. Ex: 1; 2; 3; etc.")).content
+  response = ""
+  async with store.lock(curr_date):
+    for each in split_items(args):
+      if each.isdigit(): #ensure its a digit
+        if store.delete(curr_date, int(each)) is not None: #an empty list still counts as success
+          scheduler.cancel('task', owner, f"{get_time('%m-%d-%Y')}:{int(each)}")
+          response += f"\nTask with id {each} has been deleted."
+        else:
+          response += f"\nTask with id {each} was not found. No action was taken."
+      else:
+        response += f"\nTask id must be a number."
+  response += f"\n\nYour current list of tasks is as follows:\n\n{make_text(store.read(curr_date))}"
+  return response
+
+@command('edit_task', 'eta')
+async def edit_task_command(message, owner, args):
+  """Function that changes a task's description. ARGS is "id description"; missing parts are asked for"""
+  curr_date = today(owner)
+  if not store.read(curr_date):
+    return f"The tasks list is empty or nonexistent. Create one now using '{PREFIX}create_task'."
+  id, text = split_first(args)
+  if not id:
+    await send_text(message.channel, make_text(store.read(curr_date)))
+    id = (await sessions.ask(message, "Please enter the ID number of the task you want to edit.")).content.strip()
+  if not id.isdigit(): #make sure id is a digit
+    return f"Task id must be a number."
+  if not text.strip():
+    text = (await sessions.ask(message, f"Please enter the new description for task number {id}.")).content
+  async with store.lock(curr_date):
+    precheck = store.edit(curr_date, int(id), 'content', text.strip()) #make sure this doesnt fail
+  if not precheck:
+    return f"Task with id {id} was not found. No action was taken."
+  response = f"Task with id {id} has been edited to '{text.strip()}'."
+  response += f"\n\nYour current list of tasks is as follows:\n\n{make_text(store.read(curr_date))}"
+  return response
+
+@command('toggle_status', 'ts')
+async def toggle_status_command(message, owner, args):
+  """Function that toggles the status of the task id in ARGS, or asks for it"""
+  curr_date = today(owner)
+  if not args:
+    await send_text(message.channel, make_text(store.read(curr_date)))
+    args = (await sessions.ask(message, "Please enter the ID number of the task you want to change the status of.")).content.strip()
+  if not args.isdigit(): #ensure its a digit
+    return f"Task id must be a number."
+  async with store.lock(curr_date):
+    precheck = store.toggle(curr_date, int(args)) #make sure this command doesnt fail
+  if not precheck:
+    return f"Task with id {args} was not found. No action was taken."
+  response = f"Task with id {args} has had its status toggled."
+  response += f"\n\nYour current list of tasks is as follows:\n\n{make_text(store.read(curr_date))}"
+  return response
+
+@command('remind', 'rt')
+async def remind_command(message, owner, args):
+  """Function that sets when a task is due and schedules a reminder for it. ARGS is "id HH:MM",
+  or "id off" to remove the due time; missing parts are asked for"""
+  curr_date = today(owner)
+  id, due = split_first(args)
+  if not id:
+    await send_text(message.channel, make_text(store.read(curr_date)))
+    id = (await sessions.ask(message, "Please enter the ID number of the task you want to be reminded about.")).content.strip()
+  if not id.isdigit(): #ensure its a digit
+    return "Task id must be a number."
+  due = due.strip()
+  if not due:
+    due = (await sessions.ask(message, f"Please enter the time task number {id} is due as HH:MM (24-hour clock), or 'off' to remove it.")).content.strip()
+  target = f"{get_time('%m-%d-%Y')}:{id}" #task ids are only unique within one day's list
+  if due.lower() == 'off':
+    async with store.lock(curr_date):
+      precheck = store.edit(curr_date, int(id), 'due', None)
+    if precheck is None:
+      return f"Task with id {id} was not found. No action was taken."
+    scheduler.cancel('task', owner, target)
+    return f"Task with id {id} no longer has a due time."
+  try:
+    hour_minute = dt.strptime(due, "%H:%M")
+  except ValueError:
+    return "The time must look like HH:MM, e.g. 17:30."
+  moment = dt.now().replace(hour=hour_minute.hour, minute=hour_minute.minute, second=0, microsecond=0)
+  if moment <= dt.now():
+    return f"{due} has already passed today."
+  async with store.lock(curr_date):
+    precheck = store.edit(curr_date, int(id), 'due', moment.strftime("%H:%M"))
+  if precheck is None:
+    return f"Task with id {id} was not found. No action was taken."
+  scheduler.schedule(moment.timestamp(), 'task', owner, target)
+  response = f"Task with id {id} is due at {moment.strftime('%H:%M')}. You will be reminded then if it is not done."
+  response += f"\n\nYour current list of tasks is as follows:\n\n{make_text(store.read(curr_date))}"
+  return response
+
+@command('create_template', 'cte')
+async def create_template_command(message, owner, args):
+  """Function that adds tasks to a template. ARGS is "day task; task"; missing parts are asked for"""
+  day, args = await ask_day(message, args, "Please enter the day you want to create a template for.\nDays accepted include Sunday, Monday, Tuesday, Wednesday, Thursday, Friday, or Saturday.")
+  if day is None:
+    return "Input does not match one of the valid days."
+  template = os.path.join(owner, day)
+  await store.preload(template)
+  if not args:
+    args = (await sessions.ask(message, f"Please enter a list of task description separated by semi-colons. Ex: Wake up; Eat breakfast; Go to sleep.")).content
+  async with store.lock(template):
+    create_template(owner, day, split_items(args))
+  response = f"Template for day {day} created. It will automatically apply the next time it is {day}. If the template you created is for today, run '{PREFIX}load_template' to add the tasks to today's task list."
+  response += f"\n\nThe template's list of tasks is as follows:\n\n{make_text(store.read(template))}"
+  return response
+
+@command('delete_template', 'dte')
+async def delete_template_command(message, owner, args):
+  """Function that deletes tasks from a template. ARGS is "day id; id"; missing parts are asked for"""
+  day, args = await ask_day(message, args, "Please enter the day's template you want to edit.\nDays accepted include Sunday, Monday, Tuesday, Wednesday, Thursday, Friday, or Saturday.")
+  if day is None:
+    return "Input does not match one of the valid days."
+  template = os.path.join(owner, day)
+  await store.preload(template)
+  if not (store.exists(template) and store.read(template)): #make sure the template actually exists and has content
+    return f"A template for {day} does not exist or is blank. Create one by typing '{PREFIX}create_template'."
+  if not args:
+    await send_text(message.channel, make_text(store.read(template)))
+    args = (await sessions.ask(message, f"Please enter the id of the task you wish to delete. To delete multiple tasks, separate each id with a semi-colon. Ex: 1; 2; 3; etc.")).content
+  response = ""
+  async with store.lock(template):
+    for each in split_items(args):
+      if each.isdigit(): #ensure its a digit
+        if delete_template(owner, day, int(each)) is not None: #an empty list still counts as success
+          response += f"\nTemplate for day {day} edited. Task with id {each} is removed."
+        else:
+          response += f"\nTask with id {each} was not found. No action was taken."
+      else:
+        response += "\nTask id must be a number."
+  response += f"\n\nThe template's list of tasks is as follows:\n\n{make_text(store.read(template))}"
+  return response
+
+@command('edit_template', 'ete')
+async def edit_template_command(message, owner, args):
+  """Function that changes a template task's description. ARGS is "day id description"; missing parts are asked for"""
+  day, args = await ask_day(message, args, "Please enter the day's template you want to edit.\nDays accepted include Sunday, Monday, Tuesday, Wednesday, Thursday, Friday, or Saturday.")
+  if day is None:
+    return "Input does not match one of the valid days."
+  template = os.path.join(owner, day)
+  await store.preload(template)
+  if not (store.exists(template) and store.read(template)): #make sure the template actually exists and has content
+    return f"A template for {day} does not exist or is blank. Create one by typing '{PREFIX}create_template'."
+  id, text = split_first(args)
+  if not id:
+    await send_text(message.channel, make_text(store.read(template)))
+    id = (await sessions.ask(message, f"Please enter the id of the task you wish to edit.")).content.strip()
+  if not id.isdigit(): #ensure its a digit
+    return "Task id must be a number."
+  if not text.strip():
+    text = (await sessions.ask(message, f"Please enter the new description for task number {id}.")).content
+  async with store.lock(template):
+    precheck = edit_template(owner, day, int(id), 'content', text.strip())
+  if precheck is None:
+    return f"Task with id {id} was not found. No action was taken."
+  response = f"Template for day {day} edited. Task with id {id} has been edited."
+  response += f"\n\nThe template's list of tasks is as follows:\n\n{make_text(store.read(template))}"
+  return response
+
+@command('load_template', 'lte')
+async def load_template_command(message, owner, args):
+  """Function that adds today's template to today's list"""
+  curr_date = today(owner)
+  async with store.lock(curr_date):
+    response = load_template(owner)
+  response += f"\n\nYour current list of tasks is as follows:\n\n{make_text(store.read(curr_date))}"
+  return response
+
+@command('show_template', 'ste')
+async def show_template_command(message, owner, args):
+  """Function that shows the templates for every day of the week"""
+  response = ""
+  await store.preload(*[os.path.join(owner, day) for day in DAYS])
+  for day in DAYS:
+    if store.exists(os.path.join(owner, day)):
+      precheck = store.read(os.path.join(owner, day))
+      if precheck:
+        response += f"\n- {day}:\n{make_text(precheck)}"
+      else:
+        response += f"\n- Template file for {day} is blank.\nCreate some tasks using '{PREFIX}create_template'.\n"
+    else:
+      response += f"\n- No template file for {day}.\nCreate some tasks using '{PREFIX}create_template'.\n"
+  return response
+
+FORMATS = {'.csv': 'csv', '.jsonl': 'jsonl', '.ndjson': 'jsonl', '.json': 'jsonl'} #file extension -> format
+STATUSES = {'0': 0, '1': 1, 'false': 0, 'true': 1, 'x': 0, '✓': 1, 'undone': 0, 'done': 1, '': 0, 'none': 0} #how a status may be written in a file
+IMPORT_LIMIT = 10 * 1024 * 1024 #biggest file import reads, in bytes
+
+def bulk_targets(owner, name):
+  """Function to return the lists an import or export of NAME is about, as (day, filename): today's list
+  for 'today', a template for a day of the week, or every template for 'templates' (with DAY set to
+  tell them apart). Returns None if NAME is none of those"""
+  if name.lower() == 'today':
+    return [(None, today(owner))]
+  if name.capitalize() in DAYS:
+    return [(None, os.path.join(owner, name.capitalize()))]
+  if name.lower() == 'templates':
+    return [(day, os.path.join(owner, day)) for day in DAYS]
+  return None
+
+def read_rows(data, format):
+  """Function to go through the rows of DATA, the bytes of a CSV file with a header line or of a
+  JSON lines file (picked by FORMAT), one at a time. Yields (line number, row as a dict), or
+  (line number, what is wrong with it) for a line that cannot be read"""
+  broken = [] #(line number, what is wrong) of lines that are not UTF-8
+  last = [0] #number of the last line read
+
+  def lines():
+    for number, line in enumerate(io.BytesIO(data), 1):
+      last[0] = number
+      try:
+        yield line.decode('utf-8-sig' if number == 1 else 'utf-8')
+      except UnicodeDecodeError:
+        broken.append((number, "not UTF-8 text"))
+        yield '\n' #keeps the line numbers right, and blank lines are skipped
+
+  if format == 'csv':
+    reader = csv.DictReader(lines())
+    while True:
+      try:
+        row = next(reader)
+      except StopIteration:
+        break
+      except csv.Error as error:
+        yield from broken
+        broken.clear()
+        yield last[0], f"not valid CSV ({error})"
+        continue
+      yield from broken
+      broken.clear()
+      yield reader.line_num, row
+    yield from broken
+  else:
+    for number, line in enumerate(lines(), 1):
+      if broken:
+        yield from broken
+        broken.clear()
+      elif line.strip():
+        try:
+          row = json.loads(line)
+        except ValueError:
+          row = None
+        yield number, row if isinstance(row, dict) else "not a valid row"
+
+def parse_tasks(data, format, by_day):
+  """Function to read the tasks in DATA (see read_rows). Every row needs a content, and may have a
+  status and a due time (HH:MM); if BY_DAY is True, it also needs the day of the week it is for.
+  Returns ({day or None: [(content, status, due)]}, [what was wrong with each skipped line])"""
+  tasks, errors = {}, []
+  for number, row in read_rows(data, format):
+    if isinstance(row, str):
+      errors.append(f"line {number}: {row}")
+      continue
+    content = str(row.get('content') or '').strip()
+    status = STATUSES.get(str(row.get('status') or '').strip().lower())
+    due = str(row.get('due') or '').strip() or None
+    day = str(row.get('day') or '').strip().capitalize() if by_day else None
+    if not content:
+      errors.append(f"line {number}: no content")
+    elif status is None:
+      errors.append(f"line {number}: status should be 0 or 1")
+    elif due is not None and not re.fullmatch(r'([01]\d|2[0-3]):[0-5]\d', due):
+      errors.append(f"line {number}: due should look like HH:MM")
+    elif by_day and day not in DAYS:
+      errors.append(f"line {number}: day should be a day of the week")
+    else:
+      tasks.setdefault(day, []).append((content, status, due))
+  return tasks, errors
+
+def write_rows(rows, format, fields):
+  """Function to return ROWS (dicts with FIELDS) as the bytes of a CSV or JSON lines file, picked by FORMAT"""
+  data = io.BytesIO()
+  text = io.TextIOWrapper(data, encoding='utf-8', newline='')
+  if format == 'csv':
+    writer = csv.DictWriter(text, fields)
+    writer.writeheader()
+    writer.writerows(rows)
+  else:
+    for row in rows:
+      text.write(json.dumps(row, ensure_ascii=False) + '\n')
+  text.flush()
+  text.detach() #so DATA is not closed along with TEXT
+  return data.getvalue()
+
+@command('import')
+async def import_command(message, owner, args):
+  """Function that adds the tasks of an attached CSV or JSON lines file to the lists in ARGS (see bulk_targets),
+  all at once. With 'replace' in ARGS, they replace the tasks that were there"""
+  words = args.split()
+  replace = 'replace' in [word.lower() for word in words]
+  names = [word for word in words if word.lower() != 'replace']
+  targets = bulk_targets(owner, names[0]) if len(names) == 1 else bulk_targets(owner, 'today') if not names else None
+  if targets is None:
+    return f"Please give 'today', a day of the week or 'templates', and optionally 'replace'. Ex: {PREFIX}import Monday replace"
+  attachments = message.attachments
+  if not attachments:
+    attachments = (await sessions.ask(message, "Please reply with the .csv or .jsonl file to import attached. It needs a content column, and may have status (0 or 1) and due (HH:MM) columns, plus a day column for 'templates'.")).attachments
+  if not attachments:
+    return "No file was attached. Nothing was imported."
+  attachment = attachments[0]
+  format = FORMATS.get(os.path.splitext(attachment.filename)[1].lower())
+  if format is None:
+    return "Only .csv and .jsonl files can be imported."
+  if attachment.size > IMPORT_LIMIT:
+    return f"That file is over {IMPORT_LIMIT // (1024 * 1024)} MB. Please split it up."
+  tasks, errors = await store.run(parse_tasks, await attachment.read(), format, len(targets) > 1) #parsed off the event loop
+  if not tasks:
+    return "No tasks were found in that file. Nothing was imported." + ''.join(f"\n- {error}" for error in errors[:5])
+  await store.preload(*[filename for day, filename in targets])
+  curr_date = today(owner)
+  response = ""
+  for day, filename in targets:
+    if day not in tasks:
+      continue #a day the file says nothing about is left alone, even with replace
+    async with store.lock(filename):
+      old_list = store.read(filename) if store.exists(filename) else TaskList()
+      if replace:
+        task_list = TaskList()
+        task_list.next_id = old_list.next_id #never hand out an old id again
+        if filename == curr_date:
+          for task in old_list:
+            scheduler.cancel('task', owner, f"{get_time('%m-%d-%Y')}:{task.id}")
+      else:
+        task_list = old_list
+      added = [task_list.add(content, status, due=due) for content, status, due in tasks[day]]
+      if filename == curr_date:
+        schedule_due(owner, get_time("%m-%d-%Y"), added)
+      store.write(filename, task_list) #one change for the whole file, saved once after the command
+    metrics.count('imported_tasks_total', len(tasks[day]))
+    label = "today's list" if filename == curr_date else f"the {os.path.basename(filename)} template"
+    response += f"\nReplaced {label} with {len(tasks[day])} tasks." if replace else f"\nImported {len(tasks[day])} tasks into {label}."
+  if errors:
+    response += f"\n\n{len(errors)} lines were skipped:" + ''.join(f"\n- {error}" for error in errors[:5])
+    response += "\n- ..." if len(errors) > 5 else ""
+  return response.strip()
+
+@command('export')
+async def export_command(message, owner, args):
+  """Function that sends the lists in ARGS (see bulk_targets) as a CSV file, or a JSON lines file if ARGS has 'jsonl' in it"""
+  words = args.lower().split()
+  format = 'jsonl' if 'jsonl' in words else 'csv'
+  names = [word for word in words if word not in ('csv', 'jsonl')]
+  targets = bulk_targets(owner, names[0]) if len(names) == 1 else bulk_targets(owner, 'today') if not names else None
+  if targets is None:
+    return f"Please give 'today', a day of the week or 'templates', and optionally 'csv' or 'jsonl'. Ex: {PREFIX}export templates jsonl"
+  await store.preload(*[filename for day, filename in targets])
+  fields = (['day'] if len(targets) > 1 else []) + ['content', 'status', 'due']
+  rows = [dict({'day': day} if day else {}, content=task.content, status=task.status, due=task.due)
+          for day, filename in targets if store.exists(filename) for task in store.read(filename)]
+  if not rows:
+    return "There are no tasks to export."
+  data = await store.run(write_rows, rows, format, fields) #written off the event loop
+  name = names[0].lower() if names else 'today'
+  outbox.send(message.channel, f"Here are your {len(rows)} tasks.", file=discord.File(io.BytesIO(data), filename=f"{name}.{format}"))
+  return ""
+
+PERIODS = {'today': 1, 'week': 7, 'month': 30, 'year': 365, 'all': None} #days each period covers, counting today
+
+def parse_period(args):
+  """Function to read a period (one of PERIODS or a number of days) and a status ('done' or 'undone')
+  from ARGS, in any order. Returns (first date as YYYY-MM-DD, days, status), where status is 1, 0 or None
+  for both, or None if ARGS has something else in it. The period is a week unless given."""
+  days, status = 7, None
+  for word in args.lower().split():
+    if word in PERIODS:
+      days = PERIODS[word]
+    elif word.isdigit() and int(word) > 0:
+      days = int(word)
+    elif word in ('done', 'undone'):
+      status = int(word == 'done')
+    else:
+      return None
+  since = (dt.now() - timedelta(days=days - 1)).strftime("%Y-%m-%d") if days else '0000-00-00'
+  return since, days, status
+
+def show_date(date):
+  """Function to turn DATE from the archive (YYYY-MM-DD or YYYY-MM) into the MM-DD-YYYY (or MM-YYYY) the lists use"""
+  return '-'.join(date.split('-')[1:] + date.split('-')[:1])
+
+@command('history', 'hy')
+async def history_command(message, owner, args):
+  """Function that lists the tasks of past days, page by page. ARGS is a period and/or 'done' or 'undone'"""
+  parsed = parse_period(args)
+  if parsed is None:
+    return f"Please give a number of days or one of {', '.join(PERIODS)}, and optionally 'done' or 'undone'. Ex: {PREFIX}history week undone"
+  since, days, status = parsed
+  curr_date = today(owner)
+  lines = [f"{get_time('%m-%d-%Y')} [{'✓' if task.status else 'x'}] {task.content} - (ID: {task.id})\n"
+           for task in store.read(curr_date) if status is None or task.status == status] #today is not archived yet
+  after = None
+  page = 0
+  while True:
+    rows = await store.run(archive.tasks, os.path.relpath(owner, data_dir), since, status, after, 26) #one extra to know if there is more
+    more = len(rows) > 25
+    rows = rows[:25]
+    if rows:
+      after = (rows[-1][0], rows[-1][1])
+    lines += [f"{show_date(date)} [{'✓' if done else 'x'}] {content} - (ID: {id})\n" for date, id, content, done in rows]
+    page += 1
+    if not more:
+      break
+    await send_text(message.channel, f"Page {page}:\n" + ''.join(lines))
+    lines = []
+    try:
+      answer = await sessions.ask(message, "Reply 'more' for the next page.")
+    except SessionTimeout:
+      return "" #they did not want more
+    if answer.content.strip().lower() != 'more':
+      return "Stopped showing history."
+  if page == 1 and not lines:
+    return "No tasks found in that period."
+  return (f"Page {page}:\n" if page > 1 else "") + ''.join(lines)
+
+@command('progress', 'pg')
+async def progress_command(message, owner, args):
+  """Function that shows how many tasks were done over a period, per day (or per month for long periods)"""
+  parsed = parse_period(args)
+  if parsed is None or parsed[2] is not None:
+    return f"Please give a number of days or one of {', '.join(PERIODS)}. Ex: {PREFIX}progress month"
+  since, days, _ = parsed
+  width = 10 if days and days <= 31 else 7
+  rows = await store.run(archive.counts, os.path.relpath(owner, data_dir), since, width)
+  list = store.read(today(owner)) #today is not archived yet
+  current = (dt.now().strftime("%Y-%m-%d")[:width], len(list), sum(task.status for task in list))
+  if rows and rows[-1][0] == current[0]: #this month so far
+    rows[-1] = (current[0], rows[-1][1] + current[1], rows[-1][2] + current[2])
+  elif current[1]:
+    rows.append(current)
+  total, done = sum(row[1] for row in rows), sum(row[2] for row in rows)
+  if not total:
+    return "No tasks found in that period."
+  response = f"{done} of {total} tasks done ({done / total * 100:.0f}%).\n"
+  response += ''.join(f"- {show_date(period)}: {finished} of {count} ({finished / count * 100:.0f}%)\n" for period, count, finished in rows)
+  return response
+
+admin_ids = set() #user ids allowed to use stats, start() fills it
+
+@command('stats')
+async def stats_command(message, owner, args):
+  """Function that shows the bot's metrics to an admin"""
+  if message.author.id not in admin_ids:
+    return "Only bot admins can see the stats."
+  return metrics.summary()
+
+async def metrics_server(port):
+  """Function that serves metrics.prometheus() over HTTP on localhost PORT, for Prometheus to scrape.
+  Every request gets the metrics, whatever its path."""
+  async def answer(reader, writer):
+    try:
+      await reader.readuntil(b'\r\n\r\n') #the request itself does not matter
+      body = metrics.prometheus().encode()
+      writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/plain; version=0.0.4\r\n"
+                   + f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body)
+      await writer.drain()
+    except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+      pass
+    finally:
+      writer.close()
+  server = await asyncio.start_server(answer, '127.0.0.1', port)
+  log.info("Serving metrics on http://127.0.0.1:%s/metrics", port)
+  async with server:
+    await server.serve_forever()
+
 load_dotenv()
 intents = discord.Intents().all()
-client = commands.Bot(command_prefix=',', intents=intents)
+client = commands.Bot(command_prefix=PREFIX, intents=intents)
 
-def start(discord_bot_token, notifications_channel, notifications_frequency, start_time, end_time, blacklist=[]):
+async def lag_monitor(interval=1, report_every=60):
+    """Function that measures how late the event loop wakes up from a sleep of INTERVAL seconds.
+    Anything above zero is time the loop spent stuck on something else, such as blocking disk I/O.
+    Every sample goes into the event_loop_lag_seconds metric, and unless REPORT_EVERY
+    is None, the average and worst lag are logged every REPORT_EVERY samples."""
+    loop = asyncio.get_running_loop()
+    samples = []
+    while True:
+        before = loop.time()
+        await asyncio.sleep(interval)
+        lag = loop.time() - before - interval
+        metrics.observe('event_loop_lag_seconds', lag)
+        if report_every is None:
+            continue
+        samples.append(lag)
+        if len(samples) >= report_every:
+            log.info("Event loop lag over %d samples: average %.1f ms, worst %.1f ms.", len(samples), sum(samples) / len(samples) * 1000, max(samples) * 1000)
+            samples = []
+
+def start(discord_bot_token, notifications_channel, notifications_frequency, start_time, end_time, blacklist=[], flush_frequency=60, storage='json', data='data', measure_lag=False, reply_timeout=120, edit_reminders=False, admins=(), metrics_file=None, metrics_port=None, profile_rate=0, profile_file='profile.stats', pregenerate=1):
     """Function to start the discord bot portion.
-    The task_loop needs NOTIFICATIONS_CHANNEL to know which channel to write to, and the
-    NOTIFICATIONS_FREQUENCY (in seconds) to know how frequently to send messages.
+    Reminders are sent to every user in the channel they last used the bot in. The scheduler needs
+    NOTIFICATIONS_CHANNEL to know which channel to write to if that channel can no longer be found (only for
+    users of the server it is in, see reminder_channel), and the
+    NOTIFICATIONS_FREQUENCY (in seconds) to know how frequently to send each user their list.
     START_TIME tells the bot when to start NOT sending messages,
     END_TIME tells the bot when to end NOT sending messages. Basically, the bot will silence itself from [START_TIME, END_TIME].
         For example, START_TIME = 1 and END_TIME = 6 blocks the bot from messaging you during the period of 1 - 6 AM.
     BLACKLIST prevents messages from being read from other channels in a server.
+    FLUSH_FREQUENCY (in seconds) is how often changed lists are saved to disk. They are also saved
+    after every command and when the bot shuts down.
+    STORAGE picks how lists are saved: 'json' rewrites one file per list, 'journal' appends
+    each change to a journal next to it (see JournalBackend). Both read the same files.
+    DATA is the folder every user's lists are kept in. Lists of past days are moved into
+    DATA/archive.sqlite (see Archive) within FLUSH_FREQUENCY seconds of the day changing.
+    MEASURE_LAG logs how far behind the event loop is every minute (see lag_monitor),
+    to check that nothing is blocking it.
+    REPLY_TIMEOUT (in seconds) is how long a command waits for each answer to one of its questions.
+    EDIT_REMINDERS makes a reminder edit the previous one in place instead of posting a new message.
+    Either way, a reminder that is the same as the last one is not sent.
+    ADMINS are the user ids allowed to see the metrics with the stats command.
+    METRICS_FILE, if given, gets the metrics in the Prometheus text format every FLUSH_FREQUENCY seconds,
+    and METRICS_PORT, if given, serves them over HTTP on localhost (see metrics_server).
+    PROFILE_RATE is the fraction of commands to run under cProfile. What they spent their time on
+    is added up and saved to PROFILE_FILE every FLUSH_FREQUENCY seconds (read it with pstats).
+    PREGENERATE is how many days ahead every user's daily lists are made from their templates, once a day,
+    so the first command after midnight finds its list ready. A list made ahead of time follows
+    changes to its template until it is first used.
     DISCORD_BOT_TOKEN is used to start the bot."""
 
-    @tasks.loop(seconds=notifications_frequency)
-    async def task_loop():
-        hour = int(get_time("%H")) #gets the hour only
-        channel = client.get_channel(int(notifications_channel))
-        if hour >= start_time and hour <= end_time:
-            print(f"DEBUG: Loop triggered in {channel}. If you see None there, something is wrong.\nThe hour is {hour}, and thus a message was not sent.")
-        else:
-            print(f"DEBUG: Loop triggered in {channel}. If you see None there, something is wrong.\nThe hour is {hour}, and thus a message was sent.")
-            await channel.send(f"This is a reminder message. {init_tasks()}")
+    global data_dir
+    data_dir = data
+    store.backend = BACKENDS[storage]()
+    load_subscribers()
+    templates.load(os.path.join(data_dir, 'pregenerated'))
+    archive.open(os.path.join(data_dir, 'archive.sqlite'))
+    sessions.timeout = reply_timeout
+    admin_ids.update(int(id) for id in admins)
+    metrics.profile_rate = profile_rate
+    scheduler.quiet = (start_time, end_time)
+    scheduler.load(reminders_file()) #reminders that were pending when the bot last stopped
+
+    async def save_reminders():
+        if scheduler.changed:
+            scheduler.changed = False
+            try:
+                await store.run(list_write_atomic, reminders_file(), scheduler.dump())
+            except BaseException:
+                scheduler.changed = True #try again next time
+                raise
+
+    async def save_metrics():
+        if metrics_file:
+            await store.run(write_metrics, metrics_file, metrics.prometheus())
+        if metrics.profile_changed:
+            metrics.profile_changed = False
+            metrics.profile.dump_stats(profile_file)
+
+    @tasks.loop(seconds=flush_frequency)
+    async def flush_loop():
+        steps = [
+            store.aflush, #save anything that was changed outside of a command
+            rollover, #move yesterday's lists into the archive once the day is over
+            lambda: templates.pregenerate(pregenerate),
+            lambda: templates.save(os.path.join(data_dir, 'pregenerated')),
+            save_reminders,
+            save_metrics,
+        ]
+        for step in steps:
+            try:
+                await step()
+            except Exception: #one failing step must not stop the others, or the loop itself
+                log.exception("Periodic task failed")
+                metrics.count('flush_errors_total')
+
+    async def reminder_channel(owner, entry):
+        """Function to find the channel to remind OWNER in, from their subscribers ENTRY.
+        Direct message users get a DM channel made for them if it is not cached. Server users fall back to
+        NOTIFICATIONS_CHANNEL only if it is in their own server, so nobody's list ends up in a channel
+        of another server or in public when it was kept in DMs. Returns None if there is no such channel."""
+        channel = client.get_channel(entry["channel"])
+        if channel is not None:
+            return channel
+        guild = os.path.relpath(owner, data_dir).split(os.sep)[1] #owner_dir() puts the server, or dm, there
+        try:
+            if guild == 'dm':
+                user = client.get_user(entry["user"]) or await client.fetch_user(entry["user"])
+                return await user.create_dm()
+            channel = await client.fetch_channel(entry["channel"])
+        except discord.HTTPException: #deleted, or we are no longer allowed in
+            channel = client.get_channel(int(notifications_channel))
+            if channel is None or getattr(channel, 'guild', None) is None or str(channel.guild.id) != guild:
+                return None
+        return channel
+
+    async def fire(kind, owner, target, when):
+        """Function that sends reminder KIND to OWNER when the scheduler says it is due (at timestamp WHEN).
+        'digest' reminders send the whole list and schedule the next one, 'task' reminders
+        are about the single task TARGET ("MM-DD-YYYY:id") and are skipped if it is done,
+        or if it is no longer due at WHEN (its due time changed, or it is not the same task anymore)."""
+        entry = subscribers.get(owner)
+        if entry is None:
+            return
+        channel = await reminder_channel(owner, entry)
+        if channel is None:
+            log.warning("No channel found to remind %s.", owner)
+            return
+        if kind == 'digest':
+            scheduler.schedule(time.time() + notifications_frequency, 'digest', owner) #the next one
+            curr_date = today(owner)
+            await store.preload(curr_date)
+            await templates.refresh(os.path.join(owner, get_time("%A")))
+            async with store.lock(curr_date): #init_tasks may create today's list
+                text = init_tasks(owner)
+            if outbox.remind(channel, owner, f"<@{entry['user']}> This is a reminder message. {text}", edit_reminders):
+                log.debug("Sending reminder to %s.", owner)
+                metrics.count('reminders_total', kind=kind, result='sent')
+            else:
+                metrics.count('reminders_total', kind=kind, result='unchanged')
+        elif kind == 'task':
+            date, _, id = target.partition(':')
+            filename = os.path.join(owner, date)
+            await store.preload(filename)
+            task = store.read(filename).get(int(id)) if store.exists(filename) else None
+            if task is not None and not task.status and task.due is not None \
+                    and abs(scheduler.next_allowed(dt.strptime(f"{date} {task.due}", "%m-%d-%Y %H:%M").timestamp()) - when) < 1:
+                await send_text(channel, f"<@{entry['user']}> Task '{task.content}' (ID: {task.id}) is due now.")
+                metrics.count('reminders_total', kind=kind, result='sent')
 
     @client.event
     async def on_ready():
-        task_loop.start()
-        print('Online. blacklisted channel IDs:', blacklist)
+        if not flush_loop.is_running():
+            flush_loop.start()
+            for owner in subscribers: #users from before the reminders file existed
+                if not scheduler.scheduled('digest', owner):
+                    scheduler.schedule(time.time() + notifications_frequency, 'digest', owner)
+            asyncio.create_task(scheduler.run(fire))
+            asyncio.create_task(lag_monitor(report_every=60 if measure_lag else None))
+            if metrics_port:
+                asyncio.create_task(metrics_server(metrics_port))
+        log.info('Online. blacklisted channel IDs: %s', blacklist)
+
+    async def run_command(message, handler, args):
+        """Function that runs the command HANDLER with ARGS for MESSAGE and sends the response"""
+        owner = owner_dir(message.guild.id if message.guild else None, message.author.id) #whose lists to use
+        curr_date = today(owner) #check if we need a new daily list
+        await store.preload(curr_date) #read today's list off the event loop
+        await templates.refresh(os.path.join(owner, get_time("%A"))) #and today's template, if it changed
+        async with store.lock(curr_date):
+            templates.use(owner, get_time("%m-%d-%Y")) #create it, or bring a list made ahead of time up to date with its template
+        try:
+            response = await handler(message, owner, args)
+        except SessionTimeout:
+            response = f"No reply was received within {sessions.timeout} seconds, so nothing was changed. Please run the command again."
+        await subscribe(owner, message.author.id, message.channel.id) #remind them where they talk to us
+        if not scheduler.scheduled('digest', owner):
+            scheduler.schedule(time.time() + notifications_frequency, 'digest', owner)
+        await store.aflush() #save everything this command changed in one go
+        await send_text(message.channel, response) #send out the response
 
     @client.event
     async def on_message(message):
-        def check(message):
-            return message.author == message.author and message.channel == message.channel and not message.author.bot
-        if str(message.channel.id) not in blacklist:
-            if message.author == client.user or message.author.bot:
-                return
-            print("DEBUG: Message Received:", message.content)
-            curr_date = get_time("%m-%d-%Y") #check if we need a new daily list
-            if not os.path.isfile(curr_date):
-                init_tasks() #if so, then create
-            if 'help' in message.content:
-                response = "Commands available to manage tasks are 'create_task', 'edit_task', 'delete_task', 'show_tasks', and 'toggle_status'."
-                response += "\n- 'create_task' or '.cta' allows you to create daily tasks by providing their descriptions."
-                response += "\n- 'edit_task' of '.eta' allows you to edit pre-existing daily tasks by overwriting their descriptions."
-                response += "\n- 'delete_task' or '.dta'  allows you to delete pre-existing daily tasks."
-                response += "\n- 'show_task' or '.sta' allows you to view all daily tasks, as well as their statuses."
-                response += "\n- 'toggle_status' or '.ts' allow you to toggle the status of a pre-existing daily task between done (✓) or not done (x)."
-                response += "\n\nCommands to edit templates include 'create_template', 'edit_template', 'delete_template', 'show_template', and 'load_template'."
-                response += "\n- 'create_template' or '.cte' allows you to create or add tasks to a template for a specific day of the week by providing their descriptions."
-                response += "\n- 'edit_template' or '.ete' allows you to edit pre-existing template tasks by overwriting their descriptions."
-                response += "\n- 'delete_template' or '.dte' allows you to delete pre-existing template tasks."
-                response += "\n- 'show_template' or '.ste' allows you to view the templates for every day of the week."
-                response += "\n- 'load_template' or '.lte' allows you to load in the tasks from a template, if you have already created your daily task beforehand."
-
-            elif 'show_task' in message.content or '.sta' in message.content:
-                response = init_tasks()
-            elif 'create_task' in message.content or '.cta' in message.content:
-                await message.channel.send("Please enter the description of the task you want to add. To add multiple tasks, separate each entry with a semi-colon. Ex: Wake up; Eat breakfast; etc.") #wait for further input
-                user_input = await client.wait_for('message', check=check)
-                tasks_list = user_input.content.split("; ")
-                response = ""
-                for each in tasks_list:
-                    list_write(curr_date, create_task(list_read(curr_date), each)) #write to disk
-                    response += f"\nTask with description '{each}' has been created."
-                response += f"\n\nYour current list of tasks is as follows:\n\n{make_text(list_read(curr_date))}"
-            elif 'delete_task' in message.content or '.dta' in message.content:
-                curr_list = list_read(curr_date)
-                if curr_list:
-                    await message.channel.send(make_text(curr_list))
-                    await message.channel.send("Please enter the ID number of the task you want to delete. To delete multiple tasks, separate each id with a semi-colon. Ex: 1; 2; 3; etc.") #wait for user input
-                    user_input = await client.wait_for('message', check=check)
-                    id_list = user_input.content.split("; ")
-                    response = ""
-                    for each in id_list:
-                        if each.isdigit(): #ensure its a digit
-                            precheck = delete_task(list_read(curr_date), int(each)) #make sure this command doesnt fail
-                            if precheck or precheck == []: #kinda need to be able to interpret a blank list
-                                list_write(curr_date, precheck) #write to disk
-                                response += f"\nTask with id {each} has been deleted."
-                            else:
-                                response += f"\nTask with id {each} was not found. No action was taken."
-                        else:
-                            response += f"\nTask id must be a number."
-                    response += f"\n\nYour current list of tasks is as follows:\n\n{make_text(list_read(curr_date))}"
-                else:
-                    response = "The tasks list is empty or nonexistent. Create one now using 'create_tasks'."
-            elif 'edit_task' in message.content or '.eta' in message.content:
-                curr_list = list_read(curr_date)
-                if curr_list:
-                    await message.channel.send(make_text(curr_list))
-                    await message.channel.send("Please enter the ID number of the task you want to edit.") #get first user input
-                    user_input_id = await client.wait_for('message', check=check)
-                    if user_input_id.content.isdigit(): #make sure id is a digit
-                        await message.channel.send(f"Please enter the new description for task number {user_input_id.content}.") #then the second
-                        user_input_str = await client.wait_for('message', check=check)
-                        precheck = edit_task(list_read(curr_date), int(user_input_id.content), 'content', str(user_input_str.content)) #make sure this doesnt fail
-                        if precheck:
-                            list_write(curr_date, precheck) #write to disk
-                            response = f"Task with id {user_input_id.content} has been edited to '{user_input_str.content}'."
-                            response += f"\n\nYour current list of tasks is as follows:\n\n{make_text(list_read(curr_date))}"
-                        else:
-                            response = f"Task with id {user_input_id.content} was not found. No action was taken."
-                    else:
-                        response = f"Task id must be a number."
-                else:
-                    response = "The tasks list is empty or nonexistent. Create one now using 'create_tasks'."
-            elif 'toggle_status' in message.content or '.ts' in message.content:
-                await message.channel.send(make_text(list_read(curr_date)))
-                await message.channel.send("Please enter the ID number of the task you want to change the status of.") #wait for user input
-                user_input = await client.wait_for('message', check=check)
-                if user_input.content.isdigit(): #ensure its a digit
-                    precheck = toggle_status(list_read(curr_date), int(user_input.content)) #make sure this command doesnt fail
-                    if precheck: #kinda need to be able to interpret a blank list
-                        list_write(curr_date, precheck) #write to disk
-                        response = f"Task with id {user_input.content} has had its status toggled."
-                        response += f"\n\nYour current list of tasks is as follows:\n\n{make_text(list_read(curr_date))}"
-                    else:
-                        response = f"Task with id {user_input.content} was not found. No action was taken."
-                else:
-                    response = f"Task id must be a number."
-            elif 'create_template' in message.content or '.cte' in message.content:
-                await message.channel.send("Please enter the day you want to create a template for.\nDays accepted include Sunday, Monday, Tuesday, Wednesday, Thursday, Friday, or Saturday.") #wait for further input
-                user_input_day = await client.wait_for('message', check=check)
-                if user_input_day.content in ['Sunday', 'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday']:
-                    await message.channel.send(f"Please enter a list of task description separated by semi-colons. Ex: Wake up; Eat breakfast; Go to sleep.")
-                    user_input_tasks = await client.wait_for('message', check=check)
-                    tasks_list = user_input_tasks.content.split("; ")
-                    create_template(user_input_day.content, tasks_list)
-                    response = f"Template for day {user_input_day.content} created. It will automatically apply the next time it is {user_input_day.content}. If the template you created is for today, run 'load_template' to add the tasks to today's task list."
-                    response += f"\n\nThe template's list of tasks is as follows:\n\n{make_text(list_read(user_input_day.content))}"
-                else:
-                    response = "Input does not match one of the valid days."
-            elif 'delete_template' in message.content or '.dte' in message.content:
-                await message.channel.send("Please enter the day's template you want to edit.\nDays accepted include Sunday, Monday, Tuesday, Wednesday, Thursday, Friday, or Saturday.") #wait
-                user_input_day = await client.wait_for('message', check=check)
-                if user_input_day.content in ['Sunday', 'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday']:
-                    if os.path.isfile(user_input_day.content) and list_read(user_input_day.content): #make sure the template actually exists and has content
-                         await message.channel.send(make_text(list_read(user_input_day.content)))
-                         await message.channel.send(f"Please enter the id of the task you wish to delete. To delete multiple tasks, separate each id with a semi-colon. Ex: 1; 2; 3; etc.")
-                         user_input_id = await client.wait_for('message', check=check)
-                         response = ""
-                         for each in user_input_id.content.split("; "):
-                             if each.isdigit(): #ensure its a digit
-                                 precheck = delete_template(user_input_day.content, int(each))
-                                 if precheck or precheck == []: #kinda need to be able to interpret a blank list
-                                     list_write(user_input_day.content, precheck)
-                                     response += f"\nTemplate for day {user_input_day.content} edited. Task with id {each} is removed."
-                                 else:
-                                     response += f"\nTask with id {each} was not found. No action was taken."
-                             else:
-                                 response += "\nTask id must be a number."
-                         response += f"\n\nThe template's list of tasks is as follows:\n\n{make_text(list_read(user_input_day.content))}"
-                    else:
-                        response = f"A template for {user_input_day.content} does not exist or is blank. Create one by typing 'create_template'."
-                else:
-                    response = "Input does not match one of the valid days."
-            elif 'edit_template' in message.content or '.ete' in message.content:
-                await message.channel.send("Please enter the day's template you want to edit.\nDays accepted include Sunday, Monday, Tuesday, Wednesday, Thursday, Friday, or Saturday.") #wait
-                user_input_day = await client.wait_for('message', check=check)
-                if user_input_day.content in ['Sunday', 'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday']:
-                    if os.path.isfile(user_input_day.content) and list_read(user_input_day.content): #make sure the template actually exists and has content
-                         await message.channel.send(make_text(list_read(user_input_day.content)))
-                         await message.channel.send(f"Please enter the id of the task you wish to edit.")
-                         user_input_id = await client.wait_for('message', check=check)
-                         if user_input_id.content.isdigit(): #ensure its a digit
-                             await message.channel.send(f"Please enter the new description for task number {user_input_id.content}.")
-                             user_input_value = await client.wait_for('message', check=check)
-                             precheck = edit_template(user_input_day.content, int(user_input_id.content), 'content', str(user_input_value.content))
-                             if precheck or precheck == []: #kinda need to be able to interpret a blank list
-                                 list_write(user_input_day.content, precheck)
-                                 response = f"Template for day {user_input_day.content} edited. Task with id {user_input_id.content} has been edited."
-                                 response += f"\n\nThe template's list of tasks is as follows:\n\n{make_text(list_read(user_input_day.content))}"
-                             else:
-                                 response = f"Task with id {user_input_id.content} was not found. No action was taken."
-                         else:
-                             response = "Task id must be a number."
-                    else:
-                        response = f"A template for {user_input_day.content} does not exist or is blank. Create one by typing 'create_template'."
-                else:
-                    response = "Input does not match one of the valid days."
-            elif 'load_template' in message.content or '.lte' in message.content:
-                response = load_template()
-                response += f"\n\nYour current list of tasks is as follows:\n\n{make_text(list_read(curr_date))}"
-            elif 'show_template' in message.content or '.ste' in message.content:
-                response=""
-                for day in ['Sunday', 'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday']:
-                    if os.path.isfile(day):
-                        precheck = list_read(day)
-                        if precheck != []:
-                            response += f"\n- {day}:\n{make_text(precheck)}"
-                        else:
-                            response += f"\n- Template file for {day} is blank.\nCreate some tasks using 'create_template'.\n"
-                    else:
-                        response += f"\n- No template file for {day}.\nCreate some tasks using 'create_template'.\n"
-            else:
-                return #ignore anything else
-            await message.channel.send(response) #send out the response
-        else:
-            print("DEBUG: Message received in a blacklisted channel. Ignoring.")
+        if sessions.dispatch(message): #a reply to a question we asked, handled by whoever asked it
+            return
+        if message.author == client.user or message.author.bot:
+            return
+        parsed = parse_command(message.content)
+        if parsed is None or parsed[0] not in COMMANDS:
+            return #ignore anything else, before touching any lists
+        if str(message.channel.id) in blacklist:
+            log.debug("Command received in a blacklisted channel. Ignoring.")
+            return
+        name, args = parsed
+        log.debug("Command received: %s", message.content)
+        handler = COMMANDS[name]
+        await timed(handler.name, run_command(message, handler, args))
 
-    client.run(discord_bot_token)
+    try:
+        client.run(discord_bot_token)
+    finally:
+        store.flush() #do not lose unsaved changes on shutdown
+        list_write_atomic(reminders_file(), scheduler.dump())
+        if templates.changed:
+            list_write_atomic(os.path.join(data_dir, 'pregenerated'), templates.generated)
 
 ### Example way to start the bot
 
-start(os.getenv('DISCORD_API_KEY'), os.getenv('NOTIFICATIONS'), 1800, 1, 6, os.getenv('BLACKLIST'))
+if __name__ == '__main__': #so the benchmarks can import this file without starting the bot
+  logging.basicConfig(level=os.getenv('LOG_LEVEL', 'INFO'), format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+  start(os.getenv('DISCORD_API_KEY'), os.getenv('NOTIFICATIONS'), 1800, 1, 6, os.getenv('BLACKLIST'), storage=os.getenv('STORAGE', 'json'),
+        admins=[id for id in os.getenv('ADMINS', '').split(',') if id], metrics_file=os.getenv('METRICS_FILE'),
+        metrics_port=int(os.getenv('METRICS_PORT', 0)) or None, profile_rate=float(os.getenv('PROFILE_RATE', 0)))
@@ -0,0 +1,18 @@
+import asyncio
+import os
+
+import cal
+
+
+def test_rollover_sets_aside_a_broken_day_and_archives_the_rest(tmp_path, monkeypatch):
+  monkeypatch.setattr(cal, 'data_dir', str(tmp_path))
+  monkeypatch.setattr(cal, 'archive', cal.Archive())
+  cal.archive.open(str(tmp_path / 'archive.sqlite'))
+  owner = cal.owner_dir(1, 1)
+  os.makedirs(owner)
+  with open(os.path.join(owner, '01-01-2020'), 'w') as broken:
+    broken.write('[[0, [{"content"') #cut short by a crash
+  cal.list_write(os.path.join(owner, '01-02-2020'), [[0, [{"content": "Wake up"}, {"status": 1}]]])
+  asyncio.run(cal.rollover())
+  assert sorted(os.listdir(owner)) == ['01-01-2020.broken']
+  assert cal.archive.tasks(os.path.join('guilds', '1', 'users', '1'), '2020-01-01') == [('2020-01-02', 0, 'Wake up', 1)]
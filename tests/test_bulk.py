@@ -0,0 +1,13 @@
+import cal
+
+
+def test_lines_that_cannot_be_read_are_reported_and_skipped():
+  tasks, errors = cal.parse_tasks(b'content\n\xff\nWake up\n', 'csv', False)
+  assert tasks == {None: [('Wake up', 0, None)]}
+  assert errors == ['line 2: not UTF-8 text']
+  tasks, errors = cal.parse_tasks(b'content\n' + b'a' * 200000 + b'\nWake up\n', 'csv', False)
+  assert tasks == {None: [('Wake up', 0, None)]}
+  assert errors[0].startswith('line 2: not valid CSV')
+  tasks, errors = cal.parse_tasks(b'{"content": "a"}\n\xff\n[1]\n', 'jsonl', False)
+  assert tasks == {None: [('a', 0, None)]}
+  assert errors == ['line 2: not UTF-8 text', 'line 3: not a valid row']
@@ -0,0 +1,85 @@
+import asyncio
+import os
+
+import cal
+
+
+def test_command_name_ends_at_any_whitespace():
+  assert cal.parse_command(',cta\nWake up; Eat') == ('cta', 'Wake up; Eat')
+  assert cal.parse_command(',ETA\t2 Go to school') == ('eta', '2 Go to school')
+  assert cal.parse_command(',sta') == ('sta', '')
+  assert cal.parse_command('sta') is None
+
+
+class FakeMessage:
+  """Just enough of a discord.py message for the handlers that do not ask anything"""
+  def __init__(self, content=''):
+    self.content = content
+    self.attachments = []
+
+
+def today_list(tmp_path, monkeypatch, *contents):
+  """Function to give a fresh store and scheduler with today's list holding CONTENTS. Returns the owner"""
+  monkeypatch.setattr(cal, 'data_dir', str(tmp_path))
+  monkeypatch.setattr(cal, 'store', cal.TaskStore(cal.JsonBackend()))
+  monkeypatch.setattr(cal, 'scheduler', cal.Scheduler())
+  owner = cal.owner_dir(1, 1)
+  cal.store.write(cal.today(owner), cal.TaskList())
+  for content in contents:
+    cal.store.create(cal.today(owner), content)
+  return owner
+
+
+def test_deleting_a_task_cancels_its_reminder(tmp_path, monkeypatch):
+  owner = today_list(tmp_path, monkeypatch, 'a', 'b', 'c')
+  cal.store.edit(cal.today(owner), 2, 'due', '23:59')
+  cal.schedule_due(owner, cal.get_time("%m-%d-%Y"), cal.store.read(cal.today(owner)))
+  assert cal.scheduler.scheduled('task', owner, f"{cal.get_time('%m-%d-%Y')}:2")
+  asyncio.run(cal.delete_task_command(FakeMessage(), owner, '2'))
+  assert not cal.scheduler.scheduled('task', owner, f"{cal.get_time('%m-%d-%Y')}:2")
+
+
+def run(owner, content):
+  """Function to run the command in CONTENT for OWNER, like on_message does. Returns the response"""
+  name, args = cal.parse_command(content)
+  return asyncio.run(cal.COMMANDS[name](FakeMessage(content), owner, args))
+
+
+def test_arguments_may_be_split_by_newlines(tmp_path, monkeypatch):
+  owner = today_list(tmp_path, monkeypatch, 'a', 'b')
+  run(owner, ',eta 1\nB2')
+  assert cal.store.read(cal.today(owner)).get(1).content == 'B2'
+  run(owner, ',rt 1\n23:59')
+  assert cal.store.read(cal.today(owner)).get(1).due == '23:59'
+  run(owner, ',cte Monday\nX; Y')
+  assert [task.content for task in cal.store.read(os.path.join(owner, 'Monday'))] == ['X', 'Y']
+  run(owner, ',ete monday\n0\nZ')
+  assert [task.content for task in cal.store.read(os.path.join(owner, 'Monday'))] == ['Z', 'Y']
+
+
+def test_waiting_for_a_reply_is_not_counted_as_command_time(monkeypatch):
+  async def send_text(channel, text):
+    pass
+  monkeypatch.setattr(cal, 'send_text', send_text)
+  monkeypatch.setattr(cal, 'metrics', cal.Metrics())
+  cal.metrics.profile_rate = 1
+  message = FakeMessage(',eta')
+  message.channel = message.author = type('Id', (), {'id': 1})()
+
+  async def handler():
+    answer = asyncio.create_task(cal.sessions.ask(message, 'Which task?'))
+    await asyncio.sleep(0)
+    assert cal.metrics.profiler is None #another command can be sampled while this one waits
+    await asyncio.sleep(0.3)
+    reply = FakeMessage('1')
+    reply.channel = reply.author = message.channel
+    assert cal.sessions.dispatch(reply)
+    return (await answer).content
+
+  async def main():
+    return await cal.timed('eta', handler())
+  assert asyncio.run(main()) == '1'
+  command = cal.metrics.histograms[('command_seconds', (('command', 'eta'),))]
+  wait = cal.metrics.histograms[('reply_wait_seconds', (('command', 'eta'),))]
+  assert wait["sum"] >= 0.3 and command["sum"] < 0.3
+  assert cal.metrics.profiler is None and cal.metrics.profile is not None
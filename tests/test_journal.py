@@ -0,0 +1,55 @@
+import cal
+
+
+def test_torn_write_before_newline_keeps_every_record(tmp_path):
+  filename = str(tmp_path / 'list')
+  with open(filename + '.journal', 'w') as journal:
+    journal.write('["create", 0, "a", 0]\n["create", 1, "b", 0]') #crashed before the last newline
+  backend = cal.JournalBackend()
+  tasks = backend.load(filename)
+  assert [task.content for task in tasks] == ['a', 'b']
+  tasks.add('c')
+  backend.save(filename, tasks, [['create', 2, 'c', 0]])
+  assert [task.content for task in cal.JournalBackend().load(filename)] == ['a', 'b', 'c']
+
+
+def test_torn_write_inside_a_record_drops_only_that_record(tmp_path):
+  filename = str(tmp_path / 'list')
+  with open(filename + '.journal', 'w') as journal:
+    journal.write('["create", 0, "a", 0]\n["create", 1, "b"') #crashed halfway through the record
+  backend = cal.JournalBackend()
+  tasks = backend.load(filename)
+  assert [task.content for task in tasks] == ['a']
+  tasks.add('c')
+  backend.save(filename, tasks, [['create', 1, 'c', 0]])
+  assert [task.content for task in cal.JournalBackend().load(filename)] == ['a', 'c']
+
+
+def test_journal_left_behind_by_a_crash_during_compaction_is_not_replayed(tmp_path, monkeypatch):
+  filename = str(tmp_path / 'list')
+  backend = cal.JournalBackend()
+  tasks = backend.load(filename)
+  tasks.add('old')
+  backend.save(filename, tasks, [['create', 0, 'old', 0]])
+  replaced = cal.TaskList()
+  replaced.add('new', id=1) #a whole-list save that dropped 'old' without a delete record
+  monkeypatch.setattr(cal.os, 'remove', lambda path: None) #crash before the journal is removed
+  backend.save(filename, replaced, None)
+  monkeypatch.undo()
+  assert [task.content for task in cal.JournalBackend().load(filename)] == ['new']
+
+
+def test_old_files_without_generations_still_load(tmp_path):
+  filename = str(tmp_path / 'list')
+  cal.list_write(filename, [[0, [{"content": "a"}, {"status": 0}]]])
+  with open(filename + '.journal', 'w') as journal:
+    journal.write('["create", 1, "b", 0]\n')
+  backend = cal.JournalBackend()
+  tasks = backend.load(filename)
+  assert [task.content for task in tasks] == ['a', 'b']
+  tasks.add('c')
+  backend.save(filename, tasks, [['create', 2, 'c', 0]])
+  backend.compact(filename, tasks)
+  tasks.add('d')
+  backend.save(filename, tasks, [['create', 3, 'd', 0]])
+  assert [task.content for task in cal.JournalBackend().load(filename)] == ['a', 'b', 'c', 'd']
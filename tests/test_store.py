@@ -0,0 +1,45 @@
+import asyncio
+
+import cal
+
+
+class FailingBackend(cal.JournalBackend):
+  """JournalBackend whose next save fails, like on a full disk"""
+  fail = False
+
+  def save(self, filename, list, ops):
+    if self.fail:
+      self.fail = False
+      raise OSError('No space left on device')
+    super().save(filename, list, ops)
+
+
+def test_failed_flush_keeps_the_list_dirty(tmp_path):
+  filename = str(tmp_path / 'list')
+  backend = FailingBackend()
+  store = cal.TaskStore(backend)
+  store.write(filename, cal.TaskList())
+  store.flush()
+  store.create(filename, 'a')
+  backend.fail = True
+  try:
+    asyncio.run(store.aflush())
+  except OSError:
+    pass
+  assert store.dirty == {filename: None}
+  store.create(filename, 'b')
+  store.flush()
+  assert [task.content for task in cal.JournalBackend().load(filename)] == ['a', 'b']
+
+
+def test_ids_of_deleted_tasks_are_not_reused_after_a_reload(tmp_path):
+  filename = str(tmp_path / 'list')
+  store = cal.TaskStore(cal.JsonBackend())
+  store.write(filename, cal.TaskList())
+  for content in ['a', 'b', 'c']:
+    store.create(filename, content)
+  store.delete(filename, 2)
+  store.flush()
+  store = cal.TaskStore(cal.JsonBackend()) #the bot restarts
+  store.create(filename, 'd')
+  assert [(task.id, task.content) for task in store.read(filename)] == [(0, 'a'), (1, 'b'), (3, 'd')]
@@ -0,0 +1,58 @@
+import asyncio
+import os
+from datetime import datetime as dt, timedelta
+
+import cal
+
+
+def test_list_made_ahead_of_time_follows_its_template_after_a_restart(tmp_path, monkeypatch):
+  monkeypatch.setattr(cal, 'data_dir', str(tmp_path))
+  monkeypatch.setattr(cal, 'store', cal.TaskStore(cal.JsonBackend()))
+  monkeypatch.setattr(cal, 'templates', cal.Templates())
+  owner = cal.owner_dir(1, 1)
+  tomorrow = dt.now() + timedelta(days=1)
+  date, day = tomorrow.strftime("%m-%d-%Y"), tomorrow.strftime("%A")
+  cal.create_template(owner, day, ['Old'])
+  cal.templates.generate(owner, date, ahead=True)
+  cal.store.flush()
+  cal.list_write_atomic(str(tmp_path / 'pregenerated'), cal.templates.generated)
+
+  monkeypatch.setattr(cal, 'store', cal.TaskStore(cal.JsonBackend())) #the bot restarts
+  monkeypatch.setattr(cal, 'templates', cal.Templates())
+  cal.templates.load(str(tmp_path / 'pregenerated'))
+  cal.create_template(owner, day, ['Gym'])
+  cal.templates.use(owner, date)
+  cal.store.create(os.path.join(owner, date), 'Eat')
+  assert [task.content for task in cal.store.read(os.path.join(owner, date))] == ['Old', 'Gym', 'Eat']
+
+  cal.create_template(owner, day, ['Too late']) #the list is theirs once used
+  assert [task.content for task in cal.templates.use(owner, date)] == ['Old', 'Gym', 'Eat']
+
+
+def test_due_times_from_the_template_are_scheduled_when_today_starts(tmp_path, monkeypatch):
+  monkeypatch.setattr(cal, 'data_dir', str(tmp_path))
+  monkeypatch.setattr(cal, 'store', cal.TaskStore(cal.JsonBackend()))
+  monkeypatch.setattr(cal, 'templates', cal.Templates())
+  monkeypatch.setattr(cal, 'scheduler', cal.Scheduler())
+  owner = cal.owner_dir(1, 1)
+  cal.create_template(owner, cal.get_time("%A"), ['Late', 'Done'])
+  cal.store.edit(os.path.join(owner, cal.get_time("%A")), 0, 'due', '23:59')
+  cal.store.edit(os.path.join(owner, cal.get_time("%A")), 1, 'due', '23:59')
+  cal.store.toggle(os.path.join(owner, cal.get_time("%A")), 1)
+  cal.templates.use(owner, cal.get_time("%m-%d-%Y"))
+  assert [entry[1:] for entry in cal.scheduler.dump()] == [['task', owner, f"{cal.get_time('%m-%d-%Y')}:0"]]
+
+
+def test_pregeneration_skips_days_without_a_template(tmp_path, monkeypatch):
+  monkeypatch.setattr(cal, 'data_dir', str(tmp_path))
+  monkeypatch.setattr(cal, 'store', cal.TaskStore(cal.JsonBackend()))
+  monkeypatch.setattr(cal, 'templates', cal.Templates())
+  with_template, without = cal.owner_dir(1, 1), cal.owner_dir(1, 2)
+  monkeypatch.setattr(cal, 'subscribers', {with_template: {"user": 1, "channel": 1}, without: {"user": 2, "channel": 1}})
+  tomorrow = dt.now() + timedelta(days=1)
+  date, day = tomorrow.strftime("%m-%d-%Y"), tomorrow.strftime("%A")
+  cal.create_template(with_template, day, ['Gym'])
+  asyncio.run(cal.templates.pregenerate(1))
+  assert cal.store.exists(os.path.join(with_template, date))
+  assert not cal.store.exists(os.path.join(without, date))
+  assert not os.path.exists(os.path.join(without, date))